@@ -1,8 +1,16 @@
+import argparse
 import json
 import os
-import re
-import tqdm
-import distribution_parser
+from item_store import ItemWriter, iter_items, load_items
+from loot_probability import CONTAINERS_PER_ROOM
+from location_table import render_table, table_layout, RenderMemo
+from intermediate_format import load_intermediate, convert, convert_directory
+from item_index import ItemIndex, build_records
+from item_names import NORMALIZER, normalize_name
+from locale_tables import load_item_names, write_missing_items
+from render_cache import RenderCache, DEFAULT_CACHE_PATH, record_hash, template_key
+from spill_store import SpillStore, should_spill
+from table_writer import TableWriter
 
 # Dictionary to store changes for reference across the script
 item_name_changes = {}
@@ -50,73 +58,63 @@ def process_json(file_paths):
     item_counts = {}
 
     for file_key, file_path in file_paths.items():
-        with open(file_path, "r") as file:
-            data = json.load(file)
-            count = 0
-
-            if file_key == "proceduraldistributions":
-                for distribution, content in data.items():
-                    items = content.get("items", [])
-                    for entry in items:
-                        item_list.add(entry["name"])
-                        count += 1
-                    junk_items = content.get("junk", {}).get("items", [])
-                    for entry in junk_items:
-                        item_list.add(entry["name"])
-                        count += 1
-
-            elif file_key == "foraging":
-                for key, entry in data.items():
-                    item_type = entry.get("type", "")
-                    item_type = re.sub(r"^(Base\.|Radio\.|Farming\.)", "", item_type)
-                    item_list.add(item_type)
+        data = load_intermediate(file_path)
+        count = 0
+
+        if file_key == "proceduraldistributions":
+            for distribution, content in data.items():
+                items = content.get("items", [])
+                for entry in items:
+                    item_list.add(entry["name"])
+                    count += 1
+                junk_items = content.get("junk", {}).get("items", [])
+                for entry in junk_items:
+                    item_list.add(entry["name"])
                     count += 1
 
-            elif file_key == "vehicle_distributions":
-                for zone, details in data.items():
-                    items = details.get("items", {})
-                    item_list.update(items.keys())
+        elif file_key == "foraging":
+            for key, entry in data.items():
+                item_list.add(normalize_name(entry.get("type", "")))
+                count += 1
+
+        elif file_key == "vehicle_distributions":
+            for zone, details in data.items():
+                items = details.get("items", {})
+                item_list.update(items.keys())
+                count += len(items)
+                if "junk" in details:
+                    junk_items = details["junk"].get("items", {})
+                    item_list.update(junk_items.keys())
+                    count += len(junk_items)
+
+        elif file_key == "clothing":
+            for outfit, details in data.items():
+                for outfit_details in details.values():
+                    items = outfit_details.get("Items", [])
+                    item_list.update(items)
                     count += len(items)
-                    if "junk" in details:
-                        junk_items = details["junk"].get("items", {})
-                        item_list.update(junk_items.keys())
-                        count += len(junk_items)
-
-            elif file_key == "clothing":
-                for outfit, details in data.items():
-                    for outfit_details in details.values():
-                        items = outfit_details.get("Items", [])
-                        item_list.update(items)
-                        count += len(items)
-
-            elif file_key == "attached_weapons":
-                for weapon_config, details in data.items():
-                    weapons = details.get("weapons", [])
-                    for weapon in weapons:
-                        weapon = re.sub(r"^Base\.", "", weapon)
-                        item_list.add(weapon)
-                        count += 1
-
-            elif file_key == "stories":
-                for story_key, items in data.items():
-                    for item in items:
-                        # Update item name if found in the dictionary
-                        item = load_item_dictionary(item)
-                        item_list.add(item)
-                        count += 1
-
-            cleaned_item_list = set()
-
-            for item in item_list:
-                if '.' in item:
-                    item = item.split('.', 1)[1]
-                cleaned_item_list.add(item)
-
-            item_list = cleaned_item_list
-
-            item_counts[file_key] = count
+
+        elif file_key == "attached_weapons":
+            for weapon_config, details in data.items():
+                weapons = details.get("weapons", [])
+                for weapon in weapons:
+                    item_list.add(normalize_name(weapon))
+                    count += 1
+
+        elif file_key == "stories":
+            for story_key, items in data.items():
+                for item in items:
+                    # Update item name if found in the dictionary
+                    item = load_item_dictionary(item)
+                    item_list.add(item)
+                    count += 1
+
+        item_list = {normalize_name(item) for item in item_list}
+
+        item_counts[file_key] = count
 
     print(f"Unique items found: {len(item_list)}")
+    print(NORMALIZER.summary())
     for file_key, count in item_counts.items():
         print(f"Total items found in {file_key}: {count}")
 
@@ -133,473 +131,412 @@ def process_json(file_paths):
 
 
 def build_item_json(item_list, procedural_data, distribution_data, vehicle_data, foraging_data, attached_weapons_data,
-                    clothing_data, stories_data):
-    def get_container_info(item_name):
-        containers_info = []
-        for proclist, content in procedural_data.items():
-            items = content.get("items", [])
-            rolls = content.get("rolls", 0)
-            for entry in items:
-                if entry["name"] == item_name:
-                    chance = entry["chance"]
-                    for room, room_content in distribution_data.items():
-                        for container, container_content in room_content.items():
-                            proc_lists = container_content.get("procList", [])
-                            for proc_entry in proc_lists:
-                                if proc_entry.get("name") == proclist:
-                                    containers_info.append({
-                                        "Room": room,
-                                        "Container": container,
-                                        "Proclist": proclist,
-                                        "Chance": chance,
-                                        "Rolls": rolls
-                                    })
-        return containers_info
-
-    def get_vehicle_info(item_name):
-        vehicles_info = []
-        for label, details in vehicle_data.items():
-            # Split the label using camel case
-            type_parts = re.findall(r'[A-Z][^A-Z]*', label)
-
-            # Apply specific rules to determine vehicle_type and container
-            if type_parts[0] == "Mc" and len(type_parts) > 1:
-                vehicle_type = type_parts[0] + type_parts[1]
-                container = ' '.join(type_parts[2:])
-            elif ' '.join(type_parts[:2]) == "Metal Welder" and len(type_parts) > 2:
-                vehicle_type = ' '.join(type_parts[:2])
-                container = ' '.join(type_parts[2:])
-            elif ' '.join(type_parts[:3]) == "Mass Gen Fac" and len(type_parts) > 3:
-                vehicle_type = ' '.join(type_parts[:3])
-                container = ' '.join(type_parts[3:])
-            elif ' '.join(type_parts[:2]) == "Construction Worker" and len(type_parts) > 2:
-                vehicle_type = ' '.join(type_parts[:2])
-                container = ' '.join(type_parts[2:])
-            elif type_parts[0] == "Glove" or ' '.join(type_parts[:2]) == "Glove box":
-                vehicle_type = "All"
-                container = ' '.join(type_parts)
-            elif type_parts[0] == "Trunk":
-                vehicle_type = ' '.join(type_parts[1:])
-                container = type_parts[0]
-            else:
-                vehicle_type = type_parts[0]
-                container = ' '.join(type_parts[1:])
-
-            # Normalize container name for "Glovebox"
-            if container.lower() == "glovebox":
-                container = "Glove Box"
-
-            # Process item details
-            rolls = details.get("rolls", 0)
-            items = details.get("items", {})
-            if item_name in items:
-                chance = items[item_name]
-                vehicles_info.append({
-                    "Type": vehicle_type,
-                    "Container": container,
-                    "Chance": chance,
-                    "Rolls": rolls
-                })
-            junk_items = details.get("junk", {}).get("items", {})
-            if item_name in junk_items:
-                chance = junk_items[item_name]
-                vehicles_info.append({
-                    "Type": vehicle_type,
-                    "Container": container,
-                    "Chance": chance,
-                    "Rolls": rolls
-                })
-
-        return vehicles_info
-
-    def get_foraging_info(item_name):
-        item_info = foraging_data.get(item_name, {})
-        relevant_data = {}
-
-        parameters = [
-            "skill", "chance", "zones", "categories", "xp", "minCount",
-            "maxCount", "months", "bonusMonths", "malusMonths",
-            "snowChance", "rainChance", "dayChance", "nightChance"
-        ]
-
-        for param in parameters:
-            if param in item_info:
-                relevant_data[param] = item_info[param]
-
-        return relevant_data
-
-    def get_attached_weapon_info(item_name):
-        attached_weapon_matches = []
-
-        for weapon_config, details in attached_weapons_data.items():
-            # Check if the item_name exists in the list of weapons
-            weapons = details.get("weapons", [])
-            if item_name in weapons:
-                # Assign "Any" to outfit if it isn't specified in the details
-                outfits = details.get("outfit", "Any")
-                day_survived = details.get("daySurvived", 0)
-                chance = details.get("chance", 0)
-
-                # Ensure `outfits` is a list even if set to "Any"
-                if not isinstance(outfits, list):
-                    outfits = [outfits]
-
-                # Append each configuration to the matches list
-                for outfit in outfits:
-                    attached_weapon_matches.append({
-                        "outfit": outfit,
-                        "daySurvived": day_survived,
-                        "chance": chance
-                    })
-
-        return attached_weapon_matches
-
-    def get_clothing_info(item_name):
-        clothing_matches = []
-
-        for gender_outfits in ["FemaleOutfits", "MaleOutfits"]:
-            if gender_outfits in clothing_data:
-                for outfit_name, outfit_details in clothing_data[gender_outfits].items():
-                    items = outfit_details.get("Items", {})
-                    if item_name in items:
-                        guid = outfit_details.get("GUID", "")
-                        chance = items[item_name]
-                        clothing_matches.append({
-                            "GUID": guid,
-                            "Outfit": outfit_name,
-                            "Chance": chance
-                        })
-
-        return clothing_matches
-
-    def get_story_info(item_name):
-        matching_stories = []
-        for story_category, items in stories_data.items():
-            if item_name in items:
-                matching_stories.append(story_category)
-        return matching_stories
-
-    all_items = {}
-
-    for item in tqdm.tqdm(item_list, desc="Building item data"):
-        item_name = item_name_changes.get(item, item)  # Apply any saved name changes
-        all_items[item_name] = {
-            "name": item_name,
-            "Containers": get_container_info(item_name),
-            "Vehicles": get_vehicle_info(item_name),
-            "Foraging": get_foraging_info(item_name),
-            "AttachedWeapon": get_attached_weapon_info(item_name),  # Assign attached weapon info
-            "Clothing": get_clothing_info(item_name),
-            "Stories": get_story_info(item_name)
-        }
-
-        # Output to JSON file
-    os.makedirs("output", exist_ok=True)
-    with open("output/distributions/json/all_items.json", "w") as json_file:
-        json.dump(all_items, json_file, indent=4)
-    print("Completed building JSON file")
-
-
-def build_tables():
-    # Load the JSON data
-    with open("output/distributions/json/all_items.json", "r") as file:
-        all_items = json.load(file)
-
-    # Create the output directory if it doesn't exist
-    output_dir = "output/distributions/complete"
-    os.makedirs(output_dir, exist_ok=True)
-
-
-    # Helper functions to process each type
-    def process_containers(containers_list):
-        container_lines = []
-
-        for container in containers_list:
-            room = container["Room"]
-            container_name = container["Container"]
-            chance = container["Chance"]
-            rolls = container["Rolls"]
-
-            # Calculate effective_chance
-            effective_chance = round((1 - (1 - ((1 + ((100 * chance * 0.6) + (10 * rolls))) / 10000)) ** rolls) * 100,
-                                     2)
-
-            # Format each line with the specified format
-            container_line = f"{{{{!}}}} {room} {{{{!}}}}{{{{!}}}} {{{{ll|{container_name}}}}} {{{{!}}}}{{{{!}}}} {effective_chance}%"
-            container_lines.append(container_line)
-
-        # Join lines with `{{!}}-` only if there are two or more entries
-        if len(container_lines) > 1:
-            content = "\n{{!}}-\n".join(container_lines)
-        else:
-            content = "\n".join(container_lines)
-
-        # Prepend "|Containers=" to the final content
-        return f"|container=\n{content}"
-
-
-    def process_vehicles(vehicles_list):
-        vehicle_lines = []
-
-        for vehicle in vehicles_list:
-            type_ = vehicle["Type"]
-            container = vehicle["Container"]
-            chance = vehicle["Chance"]
-            rolls = vehicle["Rolls"]
-
-            # Calculate effective chance
-            effective_chance = round((1 - (1 - ((1 + ((100 * chance * 0.6) + (10 * rolls))) / 10000)) ** rolls) * 100,
-                                     2)
-
-            # Format each line with the specified format
-            vehicle_line = f"{{{{!}}}} {type_} {{{{!}}}}{{{{!}}}} {{{{ll|{container}}}}} {{{{!}}}}{{{{!}}}} {effective_chance}%"
-            vehicle_lines.append(vehicle_line)
-
-        # Join lines with `{{!}}-` only if there are two or more entries
-        if len(vehicle_lines) > 1:
-            content = "\n{{!}}-\n".join(vehicle_lines)
+                    clothing_data, stories_data, output_path="output/distributions/json/all_items.json",
+                    exact_chances=False, workers=None, store=None, rebuild=None,
+                    containers_per_room=CONTAINERS_PER_ROOM):
+    """
+    Build the per-item location data and write it to `output_path`.
+
+    Items are written one at a time as they are built, either as `all_items.json` or, when
+    `output_path` ends in `.jsonl`, as JSON Lines.
+
+    When `exact_chances` is set, container and vehicle placements also get an `ExactChance` computed
+    by `loot_probability.ExactChanceCalculator`, which `build_tables(chance_mode="exact")` renders.
+    `containers_per_room` is the number of containers of one type assumed per room when picking
+    procedural lists, see `loot_probability.CONTAINERS_PER_ROOM`.
+
+    With `workers` above 1, the records are built in that many worker processes sharing one
+    `ItemIndex`; the output is identical to a serial build.
+
+    With a `spill_store.SpillStore` as `store`, the container and vehicle indexes are kept on disk and
+    the procedural, distribution and vehicle data may be iterables of (key, value) pairs.
+
+    With `rebuild`, a set of item names, only those items and the ones missing from the existing
+    `output_path` are built; every other item keeps its existing record.
+
+    :return: List of the item names that were built
+    """
+    index = ItemIndex(procedural_data, distribution_data, vehicle_data, foraging_data, attached_weapons_data,
+                      clothing_data, stories_data, exact_chances=exact_chances, store=store,
+                      containers_per_room=containers_per_room)
+
+    # Apply any saved name changes, keeping the first occurrence of each name
+    item_names = list(dict.fromkeys(item_name_changes.get(item, item) for item in map(normalize_name, item_list)))
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    previous_records = {}
+    if rebuild is not None and os.path.exists(output_path):
+        previous_records = load_items(output_path)
+    names_to_build = [item_name for item_name in item_names
+                      if rebuild is None or item_name in rebuild or item_name not in previous_records]
+
+    # Stream each item to the output file as soon as it is built
+    import tqdm
+
+    progress_bar = tqdm.tqdm(total=len(names_to_build), desc="Building item data")
+    built_records = build_records(index, names_to_build, workers=workers, progress=progress_bar.update)
+    with ItemWriter(output_path) as writer:
+        if not previous_records:
+            for item_name, record in built_records:
+                writer.write(item_name, record)
         else:
-            content = "\n".join(vehicle_lines)
-
-        # Prepend "|vehicle=" to the final content
-        return f"|vehicle=\n{content}"
-
-
-    def process_attached_weapon(attached_weapon_list):
-        attached_weapon_lines = []
+            # Built records come back in the order asked for, so they slot in between the kept ones
+            to_build = set(names_to_build)
+            for item_name in item_names:
+                if item_name in to_build:
+                    writer.write(*next(built_records))
+                else:
+                    writer.write(item_name, previous_records[item_name])
+    progress_bar.close()
+    print(NORMALIZER.summary())
+    print("Completed building JSON file")
+    return names_to_build
 
-        for weapon in attached_weapon_list:
-            outfit = weapon["outfit"]
-            day_survived = weapon.get("daySurvived", 0)
-            chance = weapon.get("chance", 0)
 
-            # Format the line using the provided template
-            body_line = f"{{{{!}}}} {outfit} {{{{!}}}}{{{{!}}}} {day_survived} {{{{!}}}}{{{{!}}}} {chance}"
-            attached_weapon_lines.append(body_line)
+def build_tables(items_path="output/distributions/json/all_items.json", chance_mode="formula", only_items=None,
+                 aggregate=None, top_rows=None, cache_path=DEFAULT_CACHE_PATH, reuse_cache=True):
+    """
+    Render a Location table for every item in `items_path`.
 
-        # Join lines with `{{!}}-` only if there are two or more entries
-        if len(attached_weapon_lines) > 1:
-            content = "\n{{!}}-\n".join(attached_weapon_lines)
-        else:
-            content = "\n".join(attached_weapon_lines)
+    :param chance_mode: "formula" shows the closed-form effective chance, "exact" shows the `ExactChance`
+        written by `build_item_json(exact_chances=True)`
+    :param only_items: Optional set of item ids; other items keep their existing tables
+    :param aggregate: "container" or "room" to collapse the container and vehicle rows
+        (see `location_table.aggregate_rows`)
+    :param top_rows: Keep this many container and vehicle rows per table plus a summary row
+    :param cache_path: `render_cache.RenderCache` file; items whose record is unchanged since the table
+        was written are skipped. None renders every item
+    :param reuse_cache: False renders every item and rewrites `cache_path` with the new hashes, so the
+        cache always matches the tables on disk
+    """
+    import tqdm
 
-        # Prepend "|zombie=" to the final content
-        return f"|zombie=\n{content}"
+    sections = table_layout(chance_mode, aggregate, top_rows)
 
+    # Items are read one at a time, so each table is rendered while the rest of the file is still unread
+    all_items = iter_items(items_path)
 
-    def process_clothing(clothing_list):
-        clothing_lines = []
+    output_dir = "output/distributions/complete"
 
-        for clothing in clothing_list:
-            guid = clothing["GUID"]
-            outfit = clothing["Outfit"]
-            chance = clothing["Chance"]
+    # Sections identical to one already rendered are reused instead of formatted again
+    memo = RenderMemo()
 
-            # Format each line using the specified template
-            container_line = f"{{{{!}}}} {outfit} {{{{!}}}}{{{{!}}}} {chance} {{{{!}}}}{{{{!}}}} {guid}"
-            clothing_lines.append(container_line)
+    # Items whose record hasn't changed since their table was written are skipped
+    cache = RenderCache(output_dir, template_key(chance_mode, aggregate, top_rows), cache_path, reuse_cache)
 
-        # Join lines with `{{!}}-` only if there are two or more entries
-        if len(clothing_lines) > 1:
-            content = "\n{{!}}-\n".join(clothing_lines)
-        else:
-            content = "\n".join(clothing_lines)
-
-        # Prepend "|clothing=" to the final content
-        return f"|outfit=\n{content}"
-
-
-    def process_stories(stories_list):
-        story_lines = []
-
-        for story in stories_list:
-            # Determine the link based on the prefix of the story
-            if story.startswith("RZS"):
-                link = "Zone stories"
-            elif story.startswith("RBTS"):
-                link = "Table stories"
-            elif story.startswith("RB") and not story.startswith("RBTS"):
-                link = "Building stories"
-            elif story.startswith("RVS"):
-                link = "Vehicle stories"
-            else:
-                link = "Randomized stories"
-
-            # Format each story line with the specified template
-            story_line = f"{{{{!}}}} {story} {{{{!}}}}{{{{!}}}} {{{{ll|{link}}}}}"
-            story_lines.append(story_line)
-
-        # Join all story lines with `{{!}}-` if there are multiple entries
-        if len(story_lines) > 1:
-            content = "\n{{!}}-\n".join(story_lines)
-        else:
-            content = "\n".join(story_lines)
-
-        # Prepend "|story=" to the final content
-        return f"|stories=\n{content}"
-
-
-    def process_foraging(foraging_data):
-        # Helper function to convert month indexes to readable month names
-        def format_months(month_obj):
-            month_names = ["January", "February", "March", "April", "May", "June",
-                           "July", "August", "September", "October", "November", "December"]
-
-            sorted_keys = sorted(map(int, month_obj.keys()))
-
-            if not sorted_keys:
-                return "-"
-
-            # Get the first and last month indices
-            start_month = month_names[sorted_keys[0] - 1]
-            end_month = month_names[sorted_keys[-1] - 1]
-
-            # Return "X to Y" or just "X" if only one month
-            return f"{start_month} to {end_month}" if start_month != end_month else start_month
-
-        # Extract and format each component
-        min_count = foraging_data.get("minCount")
-        max_count = foraging_data.get("maxCount")
-        amount = f"{min_count}-{max_count}" if min_count is not None and max_count is not None else "-"
-
-        if amount == "---" or amount == "-":
-            amount = "1"
-
-        skill_level = foraging_data.get("skill", "-")
-
-        # Formatting Biomes with line breaks if multiple zones exist
-        zones = foraging_data.get("zones", {})
-        biomes = "<br>".join([f"{zone}: {value}" for zone, value in zones.items()]) if zones else "-"
-
-        snow = foraging_data.get("snowChance", "-")
-        rain = foraging_data.get("rainChance", "-")
-        day = foraging_data.get("dayChance", "-")
-        night = foraging_data.get("nightChance", "-")
-
-        # Formatting months available, bonus months, and malus months
-        months_available = format_months(foraging_data.get("months", {}))
-        bonus_months = format_months(foraging_data.get("bonusMonths", {}))
-        malus_months = format_months(foraging_data.get("malusMonths", {}))
-
-        # Constructing the formatted string in a single line
-        foraging_info = (
-            f"|foraging=\n{{{{!}}}} "
-            f"{amount} {{{{!}}}}{{{{!}}}}"
-            f"{skill_level} {{{{!}}}}{{{{!}}}}"
-            f"{biomes} {{{{!}}}}{{{{!}}}}"
-            f"{snow} {{{{!}}}}{{{{!}}}}"
-            f"{rain} {{{{!}}}}{{{{!}}}}"
-            f"{day} {{{{!}}}}{{{{!}}}}"
-            f"{night} {{{{!}}}}{{{{!}}}}"
-            f"{months_available} {{{{!}}}}{{{{!}}}}"
-            f"{bonus_months} {{{{!}}}}{{{{!}}}}"
-            f"{malus_months}"
-        )
-
-        return foraging_info
-
-    # Process each item and create a table
-    for item_id, item_data in tqdm.tqdm(all_items.items(), desc="Processing items"):
-        table = f"{{{{Location table|item_id={item_id}"
-
-        # Process each section if it has values
-        if item_data.get("Containers"):
-            table += "\n" + process_containers(item_data["Containers"])
-        if item_data.get("Vehicles"):
-            table += "\n" + process_vehicles(item_data["Vehicles"])
-        if item_data.get("AttachedWeapon"):
-            table += "\n" + process_attached_weapon(item_data["AttachedWeapon"])
-        if item_data.get("Clothing"):
-            table += "\n" + process_clothing(item_data["Clothing"])
-        if item_data.get("Stories"):
-            table += "\n" + process_stories(item_data["Stories"])
-        if item_data.get("Foraging"):
-            table += "\n" + process_foraging(item_data["Foraging"])
-
-        # Close the table format
-        table += "\n}}"
-
-        # Write the table to a file
-        with open(f"{output_dir}/{item_id}.txt", "w") as output_file:
-            output_file.write(table)
+    # Tables are written by background threads while the next ones are rendered
+    with TableWriter(output_dir) as writer:
+        for item_id, item_data in tqdm.tqdm(all_items, desc="Processing items"):
+            if only_items is not None and item_id not in only_items:
+                cache.keep(item_id)
+                continue
+            digest = record_hash(item_data)
+            if not cache.is_current(item_id, digest):
+                writer.write(item_id, render_table(item_id, item_data, sections, memo))
+            cache.update(item_id, digest)
+    # Only saved once every table was written
+    cache.save()
+    print(memo.summary())
+    print(cache.summary())
 
 
 def calculate_missing_items(itemname_path, itemlist_path, missing_items_path):
-    # Open and create the dictionary from the ItemName_EN.txt file
-    with open(itemname_path, 'r') as file:
-        item_dict = {}
-
-        # Process each line in the file
-        for line in file:
-            # Check for lines that contain both '.' and '='
-            if '.' in line and '=' in line:
-                # Remove the part before and including the first period, then split by '='
-                key = line.split('.')[1].split('=')[0].strip()
-                value = line.split('=')[1].strip().strip('"').strip(',')
-
-                # Add to dictionary
-                item_dict[key] = value
+    # Create the dictionary from the ItemName_EN.txt file
+    item_dict = load_item_names(itemname_path)
 
     # Load the list of keys to remove from Item_list.txt
     with open(itemlist_path, 'r') as key_file:
         keys_to_remove = {line.strip() for line in key_file}
 
-    # Remove any matching keys from the dictionary
-    filtered_dict = {k: v for k, v in item_dict.items() if k not in keys_to_remove}
-
-    # Output only the keys of the filtered dictionary to missing_items.txt
-    with open(missing_items_path, 'w') as output_file:
-        for key in filtered_dict.keys():
-            output_file.write(f"{key}\n")
+    # Output only the keys that aren't in the item list to missing_items.txt
+    write_missing_items(item_dict, keys_to_remove, missing_items_path)
 
     print("Missing items have been written to", missing_items_path)
 
 
-def main():
-    file_paths = {
-        "proceduraldistributions": "output/distributions/json/proceduraldistributions.json",
-        "foraging": "output/distributions/json/foraging.json",
-        "vehicle_distributions": "output/distributions/json/vehicle_distributions.json",
-        "clothing": "output/distributions/json/clothing.json",
-        "attached_weapons": "output/distributions/json/attached_weapons.json",
-        "stories": "output/distributions/json/stories.json",
-        "distributions": "output/distributions/json/distributions.json"
-    }
+# Parsed intermediates read by `process_json` and `build_item_json`
+FILE_PATHS = {
+    "proceduraldistributions": "output/distributions/json/proceduraldistributions.json",
+    "foraging": "output/distributions/json/foraging.json",
+    "vehicle_distributions": "output/distributions/json/vehicle_distributions.json",
+    "clothing": "output/distributions/json/clothing.json",
+    "attached_weapons": "output/distributions/json/attached_weapons.json",
+    "stories": "output/distributions/json/stories.json",
+    "distributions": "output/distributions/json/distributions.json"
+}
 
-    distribution_parser.main()
-    item_list = process_json(file_paths)
+ITEMNAME_PATH = "resources/ItemName_EN.txt"
+ITEMLIST_PATH = "output/distributions/Item_list.txt"
+MISSING_ITEMS_PATH = "output/distributions/missing_items.txt"
 
-    with open(file_paths["proceduraldistributions"], "r") as proc_file:
-        procedural_data = json.load(proc_file)
 
-    with open(file_paths["distributions"], "r") as dist_file:
-        distribution_data = json.load(dist_file)
+def run_parse(binary_intermediates=False):
+    """Parse the game resources into the intermediates in `output/distributions/json/`."""
+    # Imported here so the other steps don't pay for starting the Lua runtime
+    import distribution_parser
 
-    with open(file_paths["vehicle_distributions"], "r") as vehicle_file:
-        vehicle_data = json.load(vehicle_file)
-
-    with open(file_paths["foraging"], "r") as foraging_file:
-        foraging_data = json.load(foraging_file)
-
-    with open(file_paths["attached_weapons"], "r") as attached_weapons_file:
-        attached_weapons_data = json.load(attached_weapons_file)
+    distribution_parser.main()
+    if binary_intermediates:
+        convert_directory("output/distributions/json")
 
-    with open(file_paths["clothing"], "r") as clothing_file:
-        clothing_data = json.load(clothing_file)
 
-    with open(file_paths["stories"], "r") as stories_file:
-        stories_data = json.load(stories_file)
+def load_item_list():
+    """Read back the item list and name changes saved by `process_json`."""
+    with open(ITEMLIST_PATH, "r") as item_list_file:
+        item_list = [line.strip() for line in item_list_file if line.strip()]
 
-    build_item_json(item_list, procedural_data, distribution_data, vehicle_data, foraging_data, attached_weapons_data,
-                    clothing_data, stories_data)
+    changes_path = "output/distributions/json/item_name_changes.json"
+    if os.path.exists(changes_path):
+        with open(changes_path, "r") as changes_file:
+            item_name_changes.update(json.load(changes_file))
 
-    build_tables()
+    return item_list
 
-    itemname_path = "resources/ItemName_EN.txt"
-    itemlist_path = "output/distributions/Item_list.txt"
-    missing_items_path = "output/distributions/missing_items.txt"
 
-    calculate_missing_items(itemname_path, itemlist_path, missing_items_path)
+def run_build(binary_intermediates=False, exact_chances=False, workers=None, item_list=None, memory_budget=None,
+              rebuild=None, containers_per_room=CONTAINERS_PER_ROOM):
+    """
+    Build `all_items.json` from the parsed intermediates.
+
+    :param item_list: Items to build; when not given, `process_json` collects them first
+    :param memory_budget: Memory budget in megabytes; when the intermediates would need more, the large
+        sources are streamed from disk and their indexes spilled to a scratch SQLite database
+    :param rebuild: Only build these items and the new ones, see `build_item_json`
+    :param containers_per_room: Containers of one type per room assumed by the exact chances
+    :return: List of the item names that were built
+    """
+    if item_list is None:
+        item_list = process_json(FILE_PATHS)
+
+    store = None
+    large_sources = ["proceduraldistributions", "distributions", "vehicle_distributions"]
+    if should_spill([FILE_PATHS[key] for key in large_sources], memory_budget):
+        print(f"Intermediates exceed the {memory_budget} MB memory budget, indexing them on disk")
+        store = SpillStore(os.path.dirname(FILE_PATHS["distributions"]))
+        # Exact chances need random access to the procedural lists and distributions
+        load_large = load_intermediate if exact_chances else iter_items
+        procedural_data = load_large(FILE_PATHS["proceduraldistributions"])
+        distribution_data = load_large(FILE_PATHS["distributions"])
+        vehicle_data = iter_items(FILE_PATHS["vehicle_distributions"])
+    else:
+        procedural_data = load_intermediate(FILE_PATHS["proceduraldistributions"])
+        distribution_data = load_intermediate(FILE_PATHS["distributions"])
+        vehicle_data = load_intermediate(FILE_PATHS["vehicle_distributions"])
+    foraging_data = load_intermediate(FILE_PATHS["foraging"])
+    attached_weapons_data = load_intermediate(FILE_PATHS["attached_weapons"])
+    clothing_data = load_intermediate(FILE_PATHS["clothing"])
+    stories_data = load_intermediate(FILE_PATHS["stories"])
+
+    try:
+        built = build_item_json(item_list, procedural_data, distribution_data, vehicle_data, foraging_data,
+                                attached_weapons_data, clothing_data, stories_data, exact_chances=exact_chances,
+                                workers=workers, store=store, rebuild=rebuild,
+                                containers_per_room=containers_per_room)
+    finally:
+        if store is not None:
+            store.close()
+    if binary_intermediates:
+        convert("output/distributions/json/all_items.json")
+    return built
+
+
+def run_missing():
+    calculate_missing_items(ITEMNAME_PATH, ITEMLIST_PATH, MISSING_ITEMS_PATH)
+
+
+def run_locales(locales=None, chance_mode="formula", jobs=None, aggregate=None, top_rows=None):
+    """Render the tables and missing item reports of every translation found in `resources/`."""
+    import locale_tables
+
+    locale_tables.render_locales("output/distributions/json/all_items.json", ITEMLIST_PATH, locales,
+                                 chance_mode=chance_mode, jobs=jobs, aggregate=aggregate, top_rows=top_rows)
+
+
+def run_mods(layer_paths, exact_chances=False, workers=None, chance_mode="formula", aggregate=None, top_rows=None,
+             containers_per_room=CONTAINERS_PER_ROOM):
+    """
+    Parse the base game with mod layers applied in order, then build and render.
+
+    When only the layer list changed since the last run, only the items touched by the changed layers
+    are rebuilt and rendered again; see `mod_layers.affected_items`.
+    """
+    import mod_layers
+
+    items_path = "output/distributions/json/all_items.json"
+    tables_dir = "output/distributions/complete"
+
+    previous = mod_layers.load_manifest()
+    manifest = mod_layers.parse_layers(layer_paths)
+    item_list = sorted(process_json(FILE_PATHS))
+
+    affected = mod_layers.affected_items(previous, manifest)
+    if affected is None or not os.path.exists(items_path):
+        run_build(exact_chances=exact_chances, workers=workers, item_list=item_list,
+                  containers_per_room=containers_per_room)
+        build_tables(items_path, chance_mode=chance_mode, aggregate=aggregate, top_rows=top_rows)
+    else:
+        built = run_build(exact_chances=exact_chances, workers=workers, item_list=item_list, rebuild=affected,
+                          containers_per_room=containers_per_room)
+        print(f"Rebuilt {len(built)} items affected by the layer changes")
+        build_tables(items_path, chance_mode=chance_mode, only_items=set(built), aggregate=aggregate,
+                     top_rows=top_rows)
+
+        # Tables of items no layer provides any more
+        item_ids = {item_name_changes.get(item, item) for item in item_list}
+        if os.path.isdir(tables_dir):
+            for file_name in os.listdir(tables_dir):
+                if file_name.endswith(".txt") and file_name[:-len(".txt")] not in item_ids:
+                    os.remove(os.path.join(tables_dir, file_name))
+
+    mod_layers.save_manifest(manifest)
+    run_missing()
+
+
+def run_all(binary_intermediates=False, exact_chances=False, workers=None, chance_mode="formula", force=False,
+            jobs=None, memory_budget=None, profile_lua=False, lua_sample_interval=None, aggregate=None, top_rows=None,
+            containers_per_room=CONTAINERS_PER_ROOM):
+    """
+    Run the whole pipeline through the stage scheduler in `pipeline`.
+
+    Independent stages run concurrently, and stages whose inputs haven't changed since their last
+    checkpoint are skipped, so an interrupted run picks up where it stopped.
+    """
+    import pipeline
+
+    options = {
+        "binary_intermediates": binary_intermediates,
+        "exact_chances": exact_chances,
+        "workers": workers,
+        "chance_mode": chance_mode,
+        "memory_budget": memory_budget,
+        "profile_lua": profile_lua or bool(lua_sample_interval),
+        "lua_sample_interval": lua_sample_interval,
+        "aggregate": aggregate,
+        "top_rows": top_rows,
+        "containers_per_room": containers_per_room,
+    }
+    pipeline.run_pipeline(options, force=force, jobs=jobs)
+
+
+# Standalone tools reachable through the CLI, imported only when used
+TOOLS = {
+    "diff": ("distribution_diff", "Compare the parsed distributions of two game builds"),
+    "convert": ("intermediate_format", "Convert intermediates between JSON and the binary format"),
+    "simulate": ("loot_simulator", "Validate container and vehicle chances with a Monte Carlo simulation"),
+    "golden": ("golden_manifest", "Record or verify a golden manifest of the generated output"),
+    "batch": ("batch_builds", "Run every step for several game builds at once"),
+    "snapshot": ("snapshot_store", "Keep deduplicated snapshots of the intermediates of game builds"),
+    "analytics": ("distribution_analytics", "Report unreferenced lists, undefined lists, unmatched vehicle labels and GUIDs"),
+}
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+
+    Running without a subcommand runs the whole pipeline, the same as `all`.
+    """
+    parser = argparse.ArgumentParser(description="Generate PZwiki Location tables from Project Zomboid distributions.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    def add_containers_option(subparser):
+        subparser.add_argument("--containers-per-room", type=int, default=CONTAINERS_PER_ROOM, metavar="N",
+                               help="Containers of one type assumed per room by the exact chances "
+                                    f"(default {CONTAINERS_PER_ROOM})")
+
+    def add_build_options(subparser):
+        subparser.add_argument("--binary", action="store_true",
+                               help="Also store intermediates in the binary .pzbin format")
+        subparser.add_argument("--exact", action="store_true",
+                               help="Compute exact container and vehicle chances")
+        subparser.add_argument("--workers", type=int, help="Build item records in this many processes")
+        add_containers_option(subparser)
+        subparser.add_argument("--memory-budget", type=float,
+                               help="Memory budget in MB; larger intermediates are indexed on disk instead")
+
+    def add_render_options(subparser):
+        subparser.add_argument("--chance-mode", choices=["formula", "exact"], default="formula",
+                               help="Chance shown for containers and vehicles")
+        subparser.add_argument("--aggregate", choices=["container", "room"],
+                               help="Group container and vehicle rows by container or by room, merging equal chances")
+        subparser.add_argument("--top", type=int, metavar="N", dest="top_rows",
+                               help="Keep the N most likely container and vehicle rows plus a summary row")
+
+    parse_parser = subparsers.add_parser("parse", help="Parse the game resources into JSON intermediates")
+    parse_parser.add_argument("--binary", action="store_true",
+                              help="Also store intermediates in the binary .pzbin format")
+
+    add_build_options(subparsers.add_parser("build", help="Build all_items.json from the parsed intermediates"))
+
+    render_parser = subparsers.add_parser("render", help="Render the Location tables from all_items.json")
+    render_parser.add_argument("--items", default="output/distributions/json/all_items.json",
+                               help="Items file to render")
+    render_parser.add_argument("--no-render-cache", action="store_true",
+                               help="Render every item, even those unchanged since the last run")
+    add_render_options(render_parser)
+
+    subparsers.add_parser("missing", help="List items that have no distribution data")
+
+    mods_parser = subparsers.add_parser("mods", help="Run every step for the base game plus mod layers")
+    mods_parser.add_argument("layers", nargs="*", help="Mod folders, applied in the order given")
+    mods_parser.add_argument("--exact", action="store_true", help="Compute exact container and vehicle chances")
+    mods_parser.add_argument("--workers", type=int, help="Build item records in this many processes")
+    add_containers_option(mods_parser)
+    add_render_options(mods_parser)
+
+    locales_parser = subparsers.add_parser("locales", help="Render tables and missing items for every language")
+    locales_parser.add_argument("--lang", nargs="+", help="Locale codes to render, e.g. FR DE; defaults to all")
+    locales_parser.add_argument("--jobs", type=int, help="Number of languages rendered at once")
+    add_render_options(locales_parser)
+
+    all_parser = subparsers.add_parser("all", help="Run every step, skipping up-to-date ones (default)")
+    add_build_options(all_parser)
+    add_render_options(all_parser)
+    all_parser.add_argument("--force", action="store_true", help="Rerun every step, ignoring checkpoints")
+    all_parser.add_argument("--jobs", type=int, help="Number of steps run at once")
+    all_parser.add_argument("--profile-lua", action="store_true",
+                            help="Time Lua execution and table conversion in the parsers")
+    all_parser.add_argument("--lua-sample", type=int, metavar="INSTRUCTIONS",
+                            help="Also sample the running Lua function every this many instructions")
+
+    for name, (module_name, description) in TOOLS.items():
+        tool_parser = subparsers.add_parser(name, help=description, add_help=False)
+        tool_parser.add_argument("tool_args", nargs=argparse.REMAINDER)
+
+    # Options given straight after a tool name (e.g. `simulate -o report.json`) aren't taken by the
+    # REMAINDER argument, so they are passed on to the tool here
+    args, unknown = parser.parse_known_args(argv)
+    command = args.command or "all"
+    if command in TOOLS:
+        args.tool_args = unknown + args.tool_args
+    elif unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+
+    if command == "parse":
+        run_parse(args.binary)
+    elif command == "build":
+        run_build(args.binary, args.exact, args.workers, memory_budget=args.memory_budget,
+                  containers_per_room=args.containers_per_room)
+    elif command == "render":
+        build_tables(args.items, chance_mode=args.chance_mode, aggregate=args.aggregate, top_rows=args.top_rows,
+                     reuse_cache=not args.no_render_cache)
+    elif command == "missing":
+        run_missing()
+    elif command == "mods":
+        run_mods(args.layers, args.exact, args.workers, args.chance_mode, args.aggregate, args.top_rows,
+                 args.containers_per_room)
+    elif command == "locales":
+        run_locales(args.lang, args.chance_mode, args.jobs, args.aggregate, args.top_rows)
+    elif command in TOOLS:
+        import importlib
+
+        importlib.import_module(TOOLS[command][0]).main(args.tool_args)
+    elif args.command is None:
+        run_all()
+    else:
+        run_all(args.binary, args.exact, args.workers, args.chance_mode, args.force, args.jobs, args.memory_budget,
+                args.profile_lua, args.lua_sample, args.aggregate, args.top_rows, args.containers_per_room)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import distribution_parser
+import item_names
+import lua_profiler
+import mod_layers
+import resource_manifest
+from loot_probability import CONTAINERS_PER_ROOM
+
+# Run the whole pipeline for several game builds in one invocation.
+#
+# Every build is a resource tree laid out like `resources/` (or a folder containing one). All builds
+# share one process pool whose workers load the Lua runtime and the pipeline modules once, when they
+# start, and then take jobs from every build.
+#
+# Parsing is split into the six parsers. A parser's job is keyed by the hashes of its input files, so
+# when several builds (e.g. consecutive unstable builds) ship the same `forageDefinitions.lua` it is
+# parsed once and the result copied into each build. Parsed results are kept in `<output>/.parse_cache`,
+# so later batches reuse them too, until the code of `PARSER_MODULES` changes. Once its parsers are
+# done, each build is processed, built, rendered and checked for missing items in its own output tree,
+# `<output>/<build>/output/distributions/`.
+
+DEFAULT_OUTPUT_ROOT = "output/builds"
+CACHE_DIR_NAME = ".parse_cache"
+DONE_MARKER = ".done"
+
+# Parser name to its resources, as paths under `resources/`
+PARSERS = {
+    "parse_containers": [distribution_parser.DISTRIBUTIONS_LUA_PATH, distribution_parser.PROCEDURAL_DISTRIBUTIONS_PATH],
+    "parse_foraging": [distribution_parser.FORAGE_DEFINITIONS_PATH],
+    "parse_vehicles": [distribution_parser.VEHICLE_DISTRIBUTIONS_PATH],
+    "parse_attachedweapons": [distribution_parser.ATTACHED_WEAPON_PATH],
+    "parse_clothing": [distribution_parser.CLOTHING_FILE_PATH, distribution_parser.GUID_TABLE_PATH],
+    "parse_stories": [distribution_parser.CLASS_FILES_DIRECTORY],
+}
+
+# JSON files each parser writes; a parser that doesn't write all of them has failed
+PARSER_OUTPUTS = {
+    "parse_containers": ["distributions.json", "proceduraldistributions.json"],
+    "parse_foraging": ["foraging.json"],
+    "parse_vehicles": ["vehicle_distributions.json"],
+    "parse_attachedweapons": ["attached_weapons.json"],
+    "parse_clothing": ["clothing.json"],
+    "parse_stories": ["stories.json"],
+}
+
+# Parsers whose resources are optional (see `distribution_parser.OPTIONAL_RESOURCE_PATHS`), so an
+# empty result is a valid one
+MAY_BE_EMPTY = {"parse_stories"}
+
+# The parsers and every module of this project they import
+PARSER_MODULES = [distribution_parser, item_names, lua_profiler, mod_layers]
+
+# Files of the resource tree read after parsing, copied next to each build's output
+TEXT_RESOURCES = ["resources/ItemName_EN.txt", "resources/itemname_en.txt"]
+
+
+def resources_dir_of(tree):
+    """The `resources` folder of a build tree, which may also be the tree itself."""
+    candidate = os.path.join(tree, "resources")
+    return candidate if os.path.isdir(candidate) else tree
+
+
+def in_tree(resources_dir, path):
+    """Map a path under `resources/` to the same file in another resource tree."""
+    return os.path.join(resources_dir, os.path.relpath(path, "resources"))
+
+
+def parser_key(parser_name, paths, fingerprints):
+    """Hash of a parser, its code and the content of its inputs; equal keys give equal parsed output."""
+    digest = hashlib.sha256(parser_name.encode("utf-8"))
+    # Cached results from an older version of the parsers aren't reused
+    for module in PARSER_MODULES:
+        digest.update(resource_manifest.hash_file(module.__file__).encode("ascii"))
+    for path in paths:
+        for file_path in resource_manifest.resource_files([path]):
+            digest.update(os.path.relpath(file_path, path).encode("utf-8") + b"\0")
+            digest.update(fingerprints[file_path]["sha256"].encode("ascii"))
+    return digest.hexdigest()
+
+
+def parsed_output(path, allow_empty=False):
+    """Whether a parser wrote `path` with some data in it, or at all with `allow_empty`."""
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, "r") as parsed_file:
+            return allow_empty or bool(json.load(parsed_file))
+    except ValueError:
+        return False
+
+
+def _warm_worker():
+    # Import the Lua runtime and the pipeline once per worker instead of once per job
+    import lupa  # noqa: F401
+    import Main  # noqa: F401
+
+
+def _parse(parser_name, paths, output_dir):
+    """Run one parser on the given resources, writing its JSON into `output_dir`."""
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = [os.path.join(output_dir, file_name) for file_name in PARSER_OUTPUTS[parser_name]]
+    # Left over from an earlier failed run, they would hide a failure now
+    for path in outputs:
+        if os.path.exists(path):
+            os.remove(path)
+    if parser_name == "parse_containers":
+        distribution_parser.parse_container_files(paths[0], paths[1], output_dir)
+    elif parser_name == "parse_foraging":
+        distribution_parser.parse_foraging(paths[0], output_dir)
+    elif parser_name == "parse_vehicles":
+        distribution_parser.parse_vehicles(paths[0], output_dir)
+    elif parser_name == "parse_attachedweapons":
+        distribution_parser.parse_attachedweapons(paths[0], output_dir)
+    elif parser_name == "parse_clothing":
+        distribution_parser.parse_clothing(paths[0], paths[1], os.path.join(output_dir, "clothing.json"))
+    elif parser_name == "parse_stories":
+        distribution_parser.parse_stories(paths[0], os.path.join(output_dir, "stories.json"))
+    # Some parsers print their errors and then write nothing, or an empty result, so check the output
+    # before marking it complete; only complete results are reused
+    failed = [os.path.basename(path) for path in outputs
+              if not parsed_output(path, allow_empty=parser_name in MAY_BE_EMPTY)]
+    if failed:
+        raise RuntimeError(f"{parser_name} failed on {', '.join(paths)}: {', '.join(failed)} missing or empty")
+    open(os.path.join(output_dir, DONE_MARKER), "w").close()
+    return parser_name
+
+
+def _process_build(build_dir, parsed_dirs, options):
+    """Process, build, render and check one build in its own output tree."""
+    import Main
+
+    working_dir = os.getcwd()
+    os.chdir(build_dir)
+    try:
+        # Workers are reused between builds, so nothing may carry over from the previous one
+        Main.item_name_changes.clear()
+
+        json_dir = distribution_parser.JSON_OUTPUT_PATH
+        os.makedirs(json_dir, exist_ok=True)
+        for parsed_dir in parsed_dirs:
+            for file_name in os.listdir(parsed_dir):
+                if file_name.endswith(".json"):
+                    shutil.copyfile(os.path.join(parsed_dir, file_name), os.path.join(json_dir, file_name))
+
+        Main.process_json(Main.FILE_PATHS)
+        Main.run_build(item_list=Main.load_item_list(), exact_chances=options.get("exact_chances"),
+                       containers_per_room=options.get("containers_per_room", CONTAINERS_PER_ROOM))
+        Main.build_tables(os.path.join(json_dir, "all_items.json"), chance_mode=options.get("chance_mode", "formula"),
+                          aggregate=options.get("aggregate"), top_rows=options.get("top_rows"))
+        Main.run_missing()
+    finally:
+        os.chdir(working_dir)
+    return build_dir
+
+
+def run_batch(trees, output_root=DEFAULT_OUTPUT_ROOT, jobs=None, options=None):
+    """
+    Run the pipeline for several resource trees.
+
+    :param trees: Build folders; each build is named after its folder
+    :param output_root: Folder receiving one output tree per build
+    :param jobs: Number of worker processes, defaults to the number of cores
+    :param options: exact_chances, containers_per_room, chance_mode, aggregate and top_rows, as for
+        `Main.run_all`
+    :return: Dictionary of build name to its output folder
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    options = dict(options or {})
+    builds = {os.path.basename(os.path.normpath(tree)): resources_dir_of(tree) for tree in trees}
+    if len(builds) != len(trees):
+        raise ValueError("Build folders must have different names")
+
+    # Check and fingerprint every build before starting any parser
+    parser_inputs = {}
+    fingerprints = {}
+    for build, resources_dir in builds.items():
+        parser_inputs[build] = {name: [in_tree(resources_dir, path) for path in paths]
+                                for name, paths in PARSERS.items()}
+        optional = {in_tree(resources_dir, path) for path in distribution_parser.OPTIONAL_RESOURCE_PATHS}
+        manifest = resource_manifest.build_manifest(
+            [path for paths in parser_inputs[build].values() for path in paths
+             if path not in optional or os.path.exists(path)], resources_dir)
+        fingerprints.update(manifest["files"])
+
+    cache_root = os.path.join(output_root, CACHE_DIR_NAME)
+    parsed_dirs = {build: [] for build in builds}
+    parse_jobs = {}
+    for build, inputs in parser_inputs.items():
+        for parser_name, paths in inputs.items():
+            key = parser_key(parser_name, paths, fingerprints)
+            cache_dir = os.path.abspath(os.path.join(cache_root, parser_name, key))
+            parsed_dirs[build].append(cache_dir)
+            if not os.path.exists(os.path.join(cache_dir, DONE_MARKER)):
+                parse_jobs.setdefault(cache_dir, (parser_name, [os.path.abspath(path) for path in paths]))
+
+    parser_runs = len(builds) * len(PARSERS)
+    print(f"{len(builds)} builds: {len(parse_jobs)} of {parser_runs} parser runs needed, "
+          f"{parser_runs - len(parse_jobs)} shared or cached")
+
+    build_dirs = {}
+    for build, resources_dir in builds.items():
+        build_dir = os.path.abspath(os.path.join(output_root, build))
+        os.makedirs(os.path.join(build_dir, "resources"), exist_ok=True)
+        for path in TEXT_RESOURCES:
+            source = in_tree(resources_dir, path)
+            if os.path.exists(source):
+                shutil.copyfile(source, os.path.join(build_dir, path))
+        build_dirs[build] = build_dir
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_warm_worker) as executor:
+        parse_futures = [executor.submit(_parse, parser_name, paths, cache_dir)
+                         for cache_dir, (parser_name, paths) in parse_jobs.items()]
+        for future in parse_futures:
+            future.result()
+
+        build_futures = {executor.submit(_process_build, build_dirs[build], parsed_dirs[build], options): build
+                         for build in builds}
+        for future, build in build_futures.items():
+            future.result()
+            print(f"[{build}] done: {os.path.join(build_dirs[build], 'output', 'distributions')}")
+
+    return build_dirs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run every step for several game builds at once.")
+    parser.add_argument("trees", nargs="+", help="Resource trees, one per build (a resources folder or its parent)")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT_ROOT, help="Folder receiving one tree per build")
+    parser.add_argument("--jobs", type=int, help="Number of worker processes")
+    parser.add_argument("--exact", action="store_true", help="Compute exact container and vehicle chances")
+    parser.add_argument("--containers-per-room", type=int, default=CONTAINERS_PER_ROOM, metavar="N",
+                        help=f"Containers of one type assumed per room by the exact chances (default {CONTAINERS_PER_ROOM})")
+    parser.add_argument("--chance-mode", choices=["formula", "exact"], default="formula",
+                        help="Chance shown for containers and vehicles")
+    parser.add_argument("--aggregate", choices=["container", "room"],
+                        help="Group container and vehicle rows by container or by room, merging equal chances")
+    parser.add_argument("--top", type=int, metavar="N", dest="top_rows",
+                        help="Keep the N most likely container and vehicle rows plus a summary row")
+    args = parser.parse_args(argv)
+
+    run_batch(args.trees, args.output, args.jobs, {
+        "exact_chances": args.exact,
+        "containers_per_room": args.containers_per_room,
+        "chance_mode": args.chance_mode,
+        "aggregate": args.aggregate,
+        "top_rows": args.top_rows,
+    })
+
+
+if __name__ == "__main__":
+    main()
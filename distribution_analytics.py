@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import re
+
+from intermediate_format import load_intermediate
+from item_index import ItemIndex, split_vehicle_label
+
+# Dead and unreferenced distribution data.
+#
+# Everything is read off an `item_index.ItemIndex` that has already been built, with set operations
+# over its keys, so the report costs one pass over each index and never rescans the parsed files:
+#
+# - procedural lists that no room/container of `distributions.json` uses
+# - lists used by a room/container but not defined in `proceduraldistributions.json`
+# - vehicle labels that fall through to the default rule of `item_index.match_vehicle_label`
+# - clothing items that are still a GUID because `fileGuidTable.xml` has no file for them
+
+GUID_PATTERN = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+def analyse_index(index):
+    """
+    Find the dead and unreferenced entries of the distributions behind `index`.
+
+    :param index: An `item_index.ItemIndex`
+    :return: Report dictionary with a summary count per check and the entries found by each
+    """
+    referenced_lists = set(index.list_placements.keys())
+    defined_lists = index.procedural_lists
+
+    missing_lists = {
+        name: [{"room": room, "container": container} for room, container in index.list_placements.get(name, ())]
+        for name in sorted(referenced_lists - defined_lists, key=str)
+    }
+
+    default_labels = {}
+    for label, rule in sorted(index.vehicle_label_rules.items()):
+        if rule == "default":
+            vehicle_type, container = split_vehicle_label(label)
+            default_labels[label] = {"type": vehicle_type, "container": container}
+
+    unresolved_guids = {}
+    for item_name, placements in index.clothing_hits.items():
+        if GUID_PATTERN.match(item_name):
+            unresolved_guids[item_name] = sorted({placement.outfit for placement in placements})
+
+    report = {
+        "unreferenced_lists": sorted(defined_lists - referenced_lists),
+        "missing_lists": missing_lists,
+        "default_vehicle_labels": default_labels,
+        "unresolved_guids": dict(sorted(unresolved_guids.items())),
+    }
+    report["summary"] = {check: len(entries) for check, entries in report.items()}
+    return report
+
+
+def print_report(report):
+    for name in report["unreferenced_lists"]:
+        print(f"Unreferenced procedural list: {name}")
+    for name, placements in report["missing_lists"].items():
+        used_by = ", ".join(f"{placement['room']}/{placement['container']}" for placement in placements)
+        print(f"Undefined procedural list: {name} (used by {used_by})")
+    for label, split in report["default_vehicle_labels"].items():
+        print(f"Vehicle label with no specific rule: {label} -> {split['type']} / {split['container']}")
+    for guid, outfits in report["unresolved_guids"].items():
+        print(f"Unresolved clothing GUID: {guid} (in {', '.join(outfits)})")
+
+    summary = report["summary"]
+    print(f"{summary['unreferenced_lists']} unreferenced lists, {summary['missing_lists']} undefined lists, "
+          f"{summary['default_vehicle_labels']} vehicle labels on the default rule, "
+          f"{summary['unresolved_guids']} unresolved GUIDs")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report dead and unreferenced distribution data.")
+    parser.add_argument("--json-dir", default="output/distributions/json", help="Folder with the parsed intermediates")
+    parser.add_argument("-o", "--output", help="Optionally write the report as JSON")
+    args = parser.parse_args(argv)
+
+    def load(file_name):
+        return load_intermediate(os.path.join(args.json_dir, file_name))
+
+    index = ItemIndex(load("proceduraldistributions.json"), load("distributions.json"),
+                      load("vehicle_distributions.json"), {}, {}, load("clothing.json"), {})
+    report = analyse_index(index)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=4)
+
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
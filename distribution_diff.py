@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+from item_store import load_items
+
+
+# Key fields (joined on) and value fields (compared) for every list-shaped section of an item record
+SECTION_KEYS = {
+    "Containers": (("Room", "Container", "Proclist"), ("Chance", "Rolls", "ExactChance")),
+    "Vehicles": (("Type", "Container"), ("Chance", "Rolls", "ExactChance")),
+    "AttachedWeapon": (("outfit",), ("daySurvived", "chance")),
+    "Clothing": (("Outfit",), ("Chance", "GUID")),
+}
+
+ALL_ITEMS_CANDIDATES = [
+    os.path.join(folder, file_name)
+    for folder in ("", "json", os.path.join("distributions", "json"), os.path.join("output", "distributions", "json"))
+    for file_name in ("all_items.json", "all_items.jsonl")
+]
+
+# Prefix naming a build in the `snapshot_store` instead of a path, e.g. "snapshot:41.78.16"
+SNAPSHOT_PREFIX = "snapshot:"
+
+
+def load_snapshot(path):
+    """
+    Load the parsed item data of one game build.
+
+    `path` can either point straight at an `all_items.json`/`.jsonl` file, or at a directory containing one
+    (a copy of `output/`, `output/distributions/json/` or a whole working tree). `snapshot:<build>` loads
+    the items of a build saved in the `snapshot_store`. Raw game resource trees aren't read: parse them
+    with `Main.py parse` (and `Main.py snapshot save`) first.
+
+    :param path: Path to the snapshot file or directory
+    :return: Dictionary of item records keyed by item id
+    """
+    if path.startswith(SNAPSHOT_PREFIX):
+        from snapshot_store import SnapshotStore
+
+        return SnapshotStore().load(path[len(SNAPSHOT_PREFIX):], "all_items")
+
+    if os.path.isdir(path):
+        for candidate in ALL_ITEMS_CANDIDATES:
+            candidate_path = os.path.join(path, candidate)
+            if os.path.isfile(candidate_path):
+                path = candidate_path
+                break
+        else:
+            raise FileNotFoundError(f"No all_items.json found in {path}; parse the build first or use "
+                                    f"{SNAPSHOT_PREFIX}<build>")
+
+    return load_items(path)
+
+
+def index_rows(rows, key_fields, value_fields):
+    """Index a list of row dicts by their key fields, keeping every value tuple found under a key."""
+    index = {}
+    for row in rows:
+        key = tuple(row.get(field) for field in key_fields)
+        index.setdefault(key, []).append(tuple(row.get(field) for field in value_fields))
+
+    # Sort values so rows listed in a different order don't show up as changes
+    for values in index.values():
+        values.sort(key=repr)
+    return index
+
+
+def diff_section(old_rows, new_rows, key_fields, value_fields):
+    """
+    Compare one list-shaped section of an item between two snapshots.
+
+    Both sides are indexed by their key fields and joined on them, so the cost is linear in the
+    number of rows rather than a pairwise scan.
+
+    :return: Dictionary with "added", "removed" and "changed" entries, or None if nothing differs
+    """
+    old_index = index_rows(old_rows or [], key_fields, value_fields)
+    new_index = index_rows(new_rows or [], key_fields, value_fields)
+
+    def to_dict(key, values):
+        row = dict(zip(key_fields, key))
+        row["values"] = [dict(zip(value_fields, value)) for value in values]
+        return row
+
+    added = [to_dict(key, values) for key, values in new_index.items() if key not in old_index]
+    removed = [to_dict(key, values) for key, values in old_index.items() if key not in new_index]
+    changed = []
+    for key, new_values in new_index.items():
+        old_values = old_index.get(key)
+        if old_values is not None and old_values != new_values:
+            row = dict(zip(key_fields, key))
+            row["old"] = [dict(zip(value_fields, value)) for value in old_values]
+            row["new"] = [dict(zip(value_fields, value)) for value in new_values]
+            changed.append(row)
+
+    if not (added or removed or changed):
+        return None
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+def diff_stories(old_stories, new_stories):
+    old_set = set(old_stories or [])
+    new_set = set(new_stories or [])
+    if old_set == new_set:
+        return None
+    return {"added": sorted(new_set - old_set), "removed": sorted(old_set - new_set)}
+
+
+def diff_foraging(old_foraging, new_foraging):
+    old_foraging = old_foraging or {}
+    new_foraging = new_foraging or {}
+    changes = {}
+    for param in old_foraging.keys() | new_foraging.keys():
+        old_value = old_foraging.get(param)
+        new_value = new_foraging.get(param)
+        if old_value != new_value:
+            changes[param] = {"old": old_value, "new": new_value}
+    return changes or None
+
+
+def diff_item(old_item, new_item):
+    """
+    Compute the structured changes for a single item.
+
+    :return: Dictionary of changed sections, empty if the item is identical in both snapshots
+    """
+    changes = {}
+
+    for section, (key_fields, value_fields) in SECTION_KEYS.items():
+        section_diff = diff_section(old_item.get(section), new_item.get(section), key_fields, value_fields)
+        if section_diff:
+            changes[section] = section_diff
+
+    stories_diff = diff_stories(old_item.get("Stories"), new_item.get("Stories"))
+    if stories_diff:
+        changes["Stories"] = stories_diff
+
+    foraging_diff = diff_foraging(old_item.get("Foraging"), new_item.get("Foraging"))
+    if foraging_diff:
+        changes["Foraging"] = foraging_diff
+
+    return changes
+
+
+def diff_snapshots(old_items, new_items):
+    """
+    Compare two sets of item records, as produced by `Main.build_item_json`.
+
+    :param old_items: Item records of the older build, keyed by item id
+    :param new_items: Item records of the newer build, keyed by item id
+    :return: Report dictionary with added, removed and changed items, the items that need their
+        tables re-rendered or deleted and a per-section summary
+    """
+    added_items = sorted(new_items.keys() - old_items.keys())
+    removed_items = sorted(old_items.keys() - new_items.keys())
+
+    changed_items = {}
+    section_counts = {}
+    for item_id in sorted(old_items.keys() & new_items.keys()):
+        changes = diff_item(old_items[item_id], new_items[item_id])
+        if changes:
+            changed_items[item_id] = changes
+            for section in changes:
+                section_counts[section] = section_counts.get(section, 0) + 1
+
+    return {
+        "summary": {
+            "old_items": len(old_items),
+            "new_items": len(new_items),
+            "added": len(added_items),
+            "removed": len(removed_items),
+            "changed": len(changed_items),
+            "changed_sections": dict(sorted(section_counts.items())),
+        },
+        "added": added_items,
+        "removed": removed_items,
+        "changed": changed_items,
+        "rerender": sorted(set(added_items) | changed_items.keys()),
+        "delete": removed_items,
+    }
+
+
+def print_report(report):
+    summary = report["summary"]
+    print(f"Items: {summary['old_items']} -> {summary['new_items']}")
+    print(f"Added: {summary['added']}, removed: {summary['removed']}, changed: {summary['changed']}")
+    for section, count in summary["changed_sections"].items():
+        print(f"  {section}: {count} items changed")
+    print(f"Tables to re-render: {len(report['rerender'])}, to delete: {len(report['delete'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the parsed distributions of two game builds.")
+    parser.add_argument("old", help="Older all_items.json, a directory containing one, or snapshot:<build>")
+    parser.add_argument("new", help="Newer all_items.json, a directory containing one, or snapshot:<build>")
+    parser.add_argument("-o", "--output", default="output/distributions/diff.json",
+                        help="Where to write the JSON report")
+    parser.add_argument("--rerender-list", help="Optionally write the item ids to re-render, one per line")
+    parser.add_argument("--delete-list", help="Optionally write the removed item ids whose tables to delete, "
+                                              "one per line")
+    args = parser.parse_args(argv)
+
+    report = diff_snapshots(load_snapshot(args.old), load_snapshot(args.new))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as report_file:
+        json.dump(report, report_file, indent=4)
+
+    for list_path, item_ids in ((args.rerender_list, report["rerender"]), (args.delete_list, report["delete"])):
+        if list_path:
+            with open(list_path, "w") as list_file:
+                for item_id in item_ids:
+                    list_file.write(item_id + "\n")
+
+    print_report(report)
+    print("Diff report has been written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
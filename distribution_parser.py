@@ -2,13 +2,15 @@ import os
 import json
 import re
 import struct
-import lupa
-from lupa import LuaRuntime
-from slpp import slpp as lua_parser
-import xml.etree.ElementTree as ET
 
+from item_names import KNOWN_MODULES, normalize_name
 
-def parse_container_files(distributions_lua_path, procedural_distributions_path, output_path):
+# lupa, slpp and xml.etree are imported by the parsers that use them, so importing this module (or
+# running steps that don't parse) doesn't pay for loading the Lua runtime.
+
+
+def parse_container_files(distributions_lua_path, procedural_distributions_path, output_path, layer_paths=(),
+                          profiler=None):
     # Ensure output directory exists
     """
     Parses Lua container files to extract distribution data and convert it to JSON format.
@@ -24,10 +26,21 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
             distribution data.
         output_path (str): The directory where the output JSON files ('distributions.json' and
             'proceduraldistributions.json') will be saved.
+        layer_paths (list): Mod folders whose `Distributions.lua`/`ProceduralDistributions.lua` are
+            executed, in order, after the base files in the same Lua state (see `mod_layers`).
+        profiler (lua_profiler.LuaProfiler): Optional profiler timing Lua execution and table conversion.
+
+    Returns:
+        dict: Layer path to the set of items whose placements the layer changed.
 
     Raises:
         Exception: If there is an error executing Lua code or processing the tables.
     """
+    from lupa import LuaRuntime
+    from lua_profiler import NULL_PROFILER
+    from mod_layers import find_layer_file, container_touched_items
+
+    profiler = profiler or NULL_PROFILER
     os.makedirs(output_path, exist_ok=True)
 
     # Helper function to convert Lua tables into Python-friendly structures
@@ -51,17 +64,18 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
 
         return lua_content
 
-    # Parser for `distributions.lua` (modified to append non-procedural tables to procedural memory)
-    def distributions_parser(lua_code, procedural_memory):
-        # Initialize the Lua runtime
+    # Create a Lua runtime and execute the modified Lua code in memory
+    def new_runtime(lua_code, label):
         lua = LuaRuntime(unpack_returned_tuples=True)
 
         # Define the `is_table` helper function in Lua
         lua.execute('function is_table(x) return type(x) == "table" end')
 
-        # Execute the modified Lua code in memory
-        lua.execute(lua_code)
+        profiler.execute(lua, lua_code, label)
+        return lua
 
+    # Parser for `distributions.lua` (modified to append non-procedural tables to procedural memory)
+    def distributions_parser(lua, procedural_memory):
         # Access the global distributionTable from Lua
         distribution_table = lua.globals().distributionTable
 
@@ -81,6 +95,7 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
                         container_details['procedural'] = True
                         if 'procList' in container_content:
                             container_details['procList'] = []
+                            profiler.table(len(container_content['procList']))
                             for i in range(1, len(container_content['procList']) + 1):
                                 item = container_content['procList'][i]
                                 if lua.globals().is_table(item):
@@ -100,6 +115,7 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
                         if 'items' in container_content and lua.globals().is_table(container_content['items']):
                             items_list = container_content['items']
                             non_procedural_details['items'] = []
+                            profiler.table(len(items_list))
                             for i in range(1, len(items_list), 2):
                                 item_name = items_list[i]
                                 item_chance = items_list[i + 1]
@@ -114,6 +130,7 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
                                 'rolls': container_content['junk']['rolls'],
                                 'items': []
                             }
+                            profiler.table(len(junk_items_list))
                             for i in range(1, len(junk_items_list), 2):
                                 item_name = junk_items_list[i]
                                 item_chance = junk_items_list[i + 1]
@@ -132,16 +149,7 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
         return lua_table_to_python(output_json)
 
     # Parser for `proceduraldistributions.lua` (modified for new `items` output format)
-    def procedural_distributions_parser(lua_code, procedural_memory):
-        # Initialize the Lua runtime
-        lua = LuaRuntime(unpack_returned_tuples=True)
-
-        # Define the `is_table` helper function in Lua
-        lua.execute('function is_table(x) return type(x) == "table" end')
-
-        # Execute the modified Lua code in memory
-        lua.execute(lua_code)
-
+    def procedural_distributions_parser(lua, procedural_memory):
         # Access the ProceduralDistributions.list from Lua
         distribution_table = lua.globals().ProceduralDistributions.list
 
@@ -161,6 +169,7 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
             if 'items' in table_content and lua.globals().is_table(table_content['items']):
                 items_list = table_content['items']
                 table_details['items'] = []
+                profiler.table(len(items_list))
                 for i in range(1, len(items_list), 2):
                     item_name = items_list[i]
                     item_chance = items_list[i + 1]
@@ -175,6 +184,7 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
                     'rolls': table_content['junk']['rolls'],
                     'items': []
                 }
+                profiler.table(len(junk_items_list))
                 for i in range(1, len(junk_items_list), 2):
                     item_name = junk_items_list[i]
                     item_chance = junk_items_list[i + 1]
@@ -204,22 +214,45 @@ def parse_container_files(distributions_lua_path, procedural_distributions_path,
         lua_code_distributions = read_and_modify_lua_file(distributions_lua_path, 'distributionTable')
         lua_code_procedural = read_and_modify_lua_file(procedural_distributions_path, 'ProceduralDistributions')
 
-        # Initialize an empty dict to store the non-procedural containers from distributions
-        procedural_memory = {}
+        distributions_lua = new_runtime(lua_code_distributions, distributions_lua_path)
+        procedural_lua = new_runtime(lua_code_procedural, procedural_distributions_path)
 
-        # First, process 'distributions.lua', appending non-procedural tables to procedural_memory
-        room_data = distributions_parser(lua_code_distributions, procedural_memory)
-        save_to_json(room_data, os.path.join(output_path, 'distributions.json'))
+        def read_tables():
+            # Initialize an empty dict to store the non-procedural containers from distributions
+            procedural_memory = {}
+
+            with profiler.converting():
+                # First, process 'distributions.lua', appending non-procedural tables to procedural_memory
+                room_data = distributions_parser(distributions_lua, procedural_memory)
+
+                # Then, process 'proceduraldistributions.lua', incorporating the appended non-procedural tables
+                return room_data, procedural_distributions_parser(procedural_lua, procedural_memory)
+
+        room_data, procedural_data = read_tables()
+
+        # Each mod layer patches the tables left by the base game and the layers before it
+        touched = {}
+        for layer_path in layer_paths:
+            for lua, file_name in ((distributions_lua, 'Distributions.lua'),
+                                   (procedural_lua, 'ProceduralDistributions.lua')):
+                layer_file = find_layer_file(layer_path, file_name)
+                if layer_file:
+                    with open(layer_file, 'r') as file:
+                        profiler.execute(lua, file.read(), layer_file)
+            layer_room_data, layer_procedural_data = read_tables()
+            touched[layer_path] = container_touched_items(room_data, procedural_data, layer_room_data,
+                                                          layer_procedural_data)
+            room_data, procedural_data = layer_room_data, layer_procedural_data
 
-        # Then, process 'proceduraldistributions.lua', incorporating the appended non-procedural tables
-        procedural_data = procedural_distributions_parser(lua_code_procedural, procedural_memory)
+        save_to_json(room_data, os.path.join(output_path, 'distributions.json'))
         save_to_json(procedural_data, os.path.join(output_path, 'proceduraldistributions.json'))
+        return touched
 
     # Run the main function
-    main()
+    return main()
 
 
-def parse_foraging(forage_definitions_path, output_path):
+def parse_foraging(forage_definitions_path, output_path, layer_paths=(), profiler=None):
     """
     Parses a Lua file containing foraging definitions and extracts item data
     to generate a JSON file with item chances.
@@ -235,10 +268,25 @@ def parse_foraging(forage_definitions_path, output_path):
             foraging definitions.
         output_path (str): The directory where the output JSON file
             ('foraging.json') will be saved.
+        layer_paths (list): Mod folders whose `forageDefinitions.lua` is
+            executed, in order, after the base file in the same Lua state.
+        profiler (lua_profiler.LuaProfiler): Optional profiler timing Lua
+            execution and table conversion.
+
+    Returns:
+        dict: Layer path to the set of items whose definitions the layer changed.
 
     Raises:
         Exception: If there is an error parsing any of the Lua tables.
     """
+    import lupa
+    from lupa import LuaRuntime
+    from slpp import slpp as lua_parser
+    from lua_profiler import NULL_PROFILER
+    from mod_layers import find_layer_file, foraging_touched_items
+
+    profiler = profiler or NULL_PROFILER
+
     with open(forage_definitions_path, 'r', encoding='utf-8') as f:
         lua_code = f.read()
 
@@ -353,7 +401,7 @@ def parse_foraging(forage_definitions_path, output_path):
     full_lua_code = prelude + lua_code
 
     # Execute the modified Lua code
-    lua.execute(full_lua_code)
+    profiler.execute(lua, full_lua_code, forage_definitions_path)
 
     # Get the forageDefs table
     forageDefs = lua.globals().forageDefs
@@ -378,6 +426,7 @@ def parse_foraging(forage_definitions_path, output_path):
                 else:
                     py_value = py_value
                 py_dict[py_key] = py_value
+            profiler.table(len(py_dict))
             return py_dict
         elif lupa.lua_type(obj) == 'function':
             return str(obj)
@@ -385,7 +434,20 @@ def parse_foraging(forage_definitions_path, output_path):
             return obj
 
     # Convert the forageDefs table to a Python dictionary
-    forage_defs_dict = lua_table_to_python(forageDefs)
+    with profiler.converting():
+        forage_defs_dict = lua_table_to_python(forageDefs)
+
+    # Each mod layer adds to or changes the definitions left by the base game and the layers before it
+    touched = {}
+    for layer_path in layer_paths:
+        layer_file = find_layer_file(layer_path, 'forageDefinitions.lua')
+        if layer_file:
+            with open(layer_file, 'r', encoding='utf-8') as f:
+                profiler.execute(lua, f.read(), layer_file)
+        with profiler.converting():
+            layer_defs_dict = lua_table_to_python(lua.globals().forageDefs)
+        touched[layer_path] = foraging_touched_items(forage_defs_dict, layer_defs_dict)
+        forage_defs_dict = layer_defs_dict
 
     # Now, augment each item with its chance value
     for item_name, item_data in forage_defs_dict.items():
@@ -399,16 +461,24 @@ def parse_foraging(forage_definitions_path, output_path):
     # Write the dictionary to a JSON file
     with open(os.path.join(output_path, 'foraging.json'), 'w', encoding='utf-8') as f:
         json.dump(forage_defs_dict, f, ensure_ascii=False, indent=4)
+    return touched
 
 
-def parse_vehicles(vehicle_distributions_path, output_path):
+def parse_vehicles(vehicle_distributions_path, output_path, layer_paths=()):
     """
     Parse the Lua vehicle distribution file and convert it into JSON format.
 
     Parameters:
         vehicle_distributions_path (str): Path to the Lua file to parse.
         output_path (str): Path where the output JSON file will be written.
+        layer_paths (list): Mod folders whose `VehicleDistributions.lua` is parsed the same way and
+            laid over the base distributions in order; a mod's label replaces the same base label.
+
+    Returns:
+        dict: Layer path to the set of items whose placements the layer changed.
     """
+    from mod_layers import find_layer_file, vehicle_touched_items
+
     def parse_lua_table(lua_content):
         key_pattern = re.compile(r'VehicleDistributions\.(\w+)\s*=\s*{')
         rolls_pattern = re.compile(r'rolls\s*=\s*(\d+),')
@@ -467,6 +537,17 @@ def parse_vehicles(vehicle_distributions_path, output_path):
     except Exception as e:
         print(f"Error parsing Lua content: {e}")
         return
+
+    touched = {}
+    for layer_path in layer_paths:
+        layer_file = find_layer_file(layer_path, 'VehicleDistributions.lua')
+        if not layer_file:
+            touched[layer_path] = set()
+            continue
+        with open(layer_file, 'r', encoding='utf-8') as lua_file:
+            layer_distributions = parse_lua_table(lua_file.read())
+        touched[layer_path] = vehicle_touched_items(vehicle_distributions, layer_distributions)
+        vehicle_distributions.update(layer_distributions)
     try:
         os.makedirs(output_path, exist_ok=True)
         output_file_path = os.path.join(output_path, 'vehicle_distributions.json')
@@ -474,9 +555,10 @@ def parse_vehicles(vehicle_distributions_path, output_path):
             json.dump(vehicle_distributions, json_file, indent=4)
     except Exception as e:
         print(f"Error writing JSON file: {e}")
+    return touched
 
 
-def parse_attachedweapons(attached_weapon_path, output_path):
+def parse_attachedweapons(attached_weapon_path, output_path, layer_paths=(), profiler=None):
     """
     Parses a Lua file containing attached weapon definitions and converts it into a JSON format.
 
@@ -489,17 +571,30 @@ def parse_attachedweapons(attached_weapon_path, output_path):
     Args:
         attached_weapon_path (str): The file path to the Lua file containing attached weapon definitions.
         output_path (str): The directory where the output JSON file ('attached_weapons.json') will be saved.
+        layer_paths (list): Mod folders whose `AttachedWeaponDefinitions.lua` is executed, in order, after
+            the base file in the same Lua state.
+        profiler (lua_profiler.LuaProfiler): Optional profiler timing Lua execution and table conversion.
+
+    Returns:
+        dict: Layer path to the set of weapons whose definitions the layer changed.
 
     Raises:
         Exception: If there is an error executing Lua code or processing the Lua tables.
     """
+    import lupa
+    from lupa import LuaRuntime
+    from lua_profiler import NULL_PROFILER
+    from mod_layers import find_layer_file, attached_weapons_touched_items
+
+    profiler = profiler or NULL_PROFILER
+
     with open(attached_weapon_path, 'r') as file:
         lua_code = file.read()
 
     # Prepare the Lua environment
     lua = LuaRuntime(unpack_returned_tuples=True)
     lua.execute('AttachedWeaponDefinitions = AttachedWeaponDefinitions or {}')
-    lua.execute(lua_code)
+    profiler.execute(lua, lua_code, attached_weapon_path)
     attached_weapon_definitions = lua.eval('AttachedWeaponDefinitions')
 
     # Function to convert Lua table to Python dictionary or list
@@ -507,6 +602,7 @@ def parse_attachedweapons(attached_weapon_path, output_path):
         if lupa.lua_type(obj) == 'table':
             # Get all keys in the Lua table
             keys = list(obj.keys())
+            profiler.table(len(keys))
             # Check if all keys are consecutive integers starting from 1
             if all(isinstance(key, int) for key in keys):
                 min_key = min(keys)
@@ -523,27 +619,36 @@ def parse_attachedweapons(attached_weapon_path, output_path):
             return str(obj)
 
     # Function to remove specified prefixes
-    def remove_prefixes(name):
-        prefixes = ["Base.", "Radio.", "Farming."]
-        for prefix in prefixes:
-            if name.startswith(prefix):
-                return name[len(prefix):]
-        return name
-
-    # Convert the Lua table to a Python dictionary
-    attached_weapon_definitions_dict = lua_table_to_python(attached_weapon_definitions)
-
     # Extract weapon definitions (entries with a 'chance' field) and remove prefixes
-    weapon_definitions = {}
-    for key, value in attached_weapon_definitions_dict.items():
-        if isinstance(value, dict) and 'chance' in value:
-            # Remove prefixes from the main key
-            cleaned_key = remove_prefixes(key)
-            # If the entry has a 'weapons' list, clean each entry within that list
-            if 'weapons' in value and isinstance(value['weapons'], list):
-                value['weapons'] = [remove_prefixes(weapon) for weapon in value['weapons']]
-            # Add to the final dictionary
-            weapon_definitions[cleaned_key] = value
+    def extract_weapon_definitions(definitions):
+        # Convert the Lua table to a Python dictionary
+        with profiler.converting():
+            attached_weapon_definitions_dict = lua_table_to_python(definitions)
+
+        weapon_definitions = {}
+        for key, value in attached_weapon_definitions_dict.items():
+            if isinstance(value, dict) and 'chance' in value:
+                # Remove prefixes from the main key
+                cleaned_key = normalize_name(key)
+                # If the entry has a 'weapons' list, clean each entry within that list
+                if 'weapons' in value and isinstance(value['weapons'], list):
+                    value['weapons'] = [normalize_name(weapon) for weapon in value['weapons']]
+                # Add to the final dictionary
+                weapon_definitions[cleaned_key] = value
+        return weapon_definitions
+
+    weapon_definitions = extract_weapon_definitions(attached_weapon_definitions)
+
+    # Each mod layer adds to or changes the definitions left by the base game and the layers before it
+    touched = {}
+    for layer_path in layer_paths:
+        layer_file = find_layer_file(layer_path, 'AttachedWeaponDefinitions.lua')
+        if layer_file:
+            with open(layer_file, 'r') as file:
+                profiler.execute(lua, file.read(), layer_file)
+        layer_definitions = extract_weapon_definitions(lua.eval('AttachedWeaponDefinitions'))
+        touched[layer_path] = attached_weapons_touched_items(weapon_definitions, layer_definitions)
+        weapon_definitions = layer_definitions
 
     # Write the weapon definitions to the JSON file
     try:
@@ -559,6 +664,7 @@ def parse_attachedweapons(attached_weapon_path, output_path):
         print(f"Error writing to file {output_file_path}: {e}")
     except Exception as e:
         print(f"Unexpected error: {e}")
+    return touched
 
 
 def parse_clothing(clothing_file_path, guid_table_path, output_file_path):
@@ -570,6 +676,8 @@ def parse_clothing(clothing_file_path, guid_table_path, output_file_path):
     :param output_file_path: The path to the output JSON file
     :return: None
     """
+    import xml.etree.ElementTree as ET
+
     os.makedirs(os.path.dirname(output_file_path), exist_ok=True)
 
     def guid_item_mapping(guid_table):
@@ -682,16 +790,9 @@ def parse_stories(class_files_directory, output_path):
                 try:
                     decoded_value = value.decode("utf-8")
                     # Only add constants that contain a period and start with specified prefixes
-                    if '.' in decoded_value and decoded_value.startswith(("Base.", "Farming.", "Radio.")):
+                    if decoded_value.startswith(KNOWN_MODULES):
                         # Remove the prefix before appending
-                        if decoded_value.startswith("Base."):
-                            constants.append(decoded_value[5:])
-                        elif decoded_value.startswith("Farming."):
-                            constants.append(decoded_value[8:])
-                        elif decoded_value.startswith("Radio."):
-                            constants.append(decoded_value[6:])
-                        else:
-                            constants.append(decoded_value)
+                        constants.append(normalize_name(decoded_value))
                 except UnicodeDecodeError:
                     pass  # Skip non-UTF-8 constants
             elif tag in {7, 8}:  # CONSTANT_Class or CONSTANT_String
@@ -735,43 +836,76 @@ def parse_stories(class_files_directory, output_path):
     save_to_json(constants_by_file, output_path)
 
 
+# Game resources read by the parsers
+ATTACHED_WEAPON_PATH = "resources/lua/AttachedWeaponDefinitions.lua"
+DISTRIBUTIONS_LUA_PATH = "resources/lua/Distributions.lua"
+FORAGE_DEFINITIONS_PATH = "resources/lua/forageDefinitions.lua"
+PROCEDURAL_DISTRIBUTIONS_PATH = "resources/lua/ProceduralDistributions.lua"
+VEHICLE_DISTRIBUTIONS_PATH = "resources/lua/VehicleDistributions.lua"
+CLOTHING_FILE_PATH = "resources/clothing.xml"
+GUID_TABLE_PATH = "resources/fileGuidTable.xml"
+CLASS_FILES_DIRECTORY = "resources/Java"
+
+JSON_OUTPUT_PATH = "output/distributions/json/"
+RESOURCE_MANIFEST_PATH = os.path.join(JSON_OUTPUT_PATH, "resources_manifest.json")
+
+RESOURCE_PATHS = [ATTACHED_WEAPON_PATH, DISTRIBUTIONS_LUA_PATH, FORAGE_DEFINITIONS_PATH, PROCEDURAL_DISTRIBUTIONS_PATH,
+                  VEHICLE_DISTRIBUTIONS_PATH, CLOTHING_FILE_PATH, GUID_TABLE_PATH, CLASS_FILES_DIRECTORY]
+
+# Resources a run can do without: without the game classes in `resources/Java` no item has a story
+OPTIONAL_RESOURCE_PATHS = [CLASS_FILES_DIRECTORY]
+
+
 def main():
-    # File paths
-    attached_weapon_path = "resources/lua/AttachedWeaponDefinitions.lua"
-    distributions_lua_path = "resources/lua/Distributions.lua"
-    forage_definitions_path = "resources/lua/forageDefinitions.lua"
-    procedural_distributions_path = "resources/lua/ProceduralDistributions.lua"
-    vehicle_distributions_path = "resources/lua/VehicleDistributions.lua"
-    clothing_file_path = "resources/clothing.xml"
-    guid_table_path = "resources/fileGuidTable.xml"
-    class_files_directory = "resources/Java"
-
-    # Call the init function to check if all files exist
-    init(attached_weapon_path, distributions_lua_path, forage_definitions_path,
-         procedural_distributions_path, vehicle_distributions_path, clothing_file_path, guid_table_path)
+    # Check that every resource exists and fingerprint them before parsing anything
+    init(*RESOURCE_PATHS)
 
     # Parse files into json
-    parse_container_files(distributions_lua_path, procedural_distributions_path, "output/distributions/json/")
-    parse_foraging(forage_definitions_path, "output/distributions/json/")
-    parse_vehicles(vehicle_distributions_path, "output/distributions/json/")
-    parse_attachedweapons(attached_weapon_path, "output/distributions/json/")
-    parse_clothing(clothing_file_path, guid_table_path, "output/distributions/json/clothing.json")
-    parse_stories(class_files_directory, "output/distributions/json/stories.json")
+    parse_container_files(DISTRIBUTIONS_LUA_PATH, PROCEDURAL_DISTRIBUTIONS_PATH, JSON_OUTPUT_PATH)
+    parse_foraging(FORAGE_DEFINITIONS_PATH, JSON_OUTPUT_PATH)
+    parse_vehicles(VEHICLE_DISTRIBUTIONS_PATH, JSON_OUTPUT_PATH)
+    parse_attachedweapons(ATTACHED_WEAPON_PATH, JSON_OUTPUT_PATH)
+    parse_clothing(CLOTHING_FILE_PATH, GUID_TABLE_PATH, os.path.join(JSON_OUTPUT_PATH, "clothing.json"))
+    parse_stories(CLASS_FILES_DIRECTORY, os.path.join(JSON_OUTPUT_PATH, "stories.json"))
 
 
 # Function to check if all resources are found
-def init(*file_paths):
-    missing_files = []
+def init(*file_paths, manifest_path=RESOURCE_MANIFEST_PATH):
+    """
+    Check that every resource exists, then write a manifest of their sizes, modification times and
+    content hashes (see `resource_manifest`). Missing `OPTIONAL_RESOURCE_PATHS` are only reported.
 
-    for path in file_paths:
-        if not os.path.exists(path):
-            missing_files.append(path)
+    Raises:
+        FileNotFoundError: If a required resource is missing, so a run stops before any parsing starts.
+
+    Returns:
+        dict: The resource manifest.
+    """
+    import resource_manifest
 
-    if not missing_files:
-        print("All resources are found.")
-    else:
-        for missing in missing_files:
+    missing_files = []
+    missing_optional = []
+    for missing in resource_manifest.missing_resources(file_paths):
+        if missing in OPTIONAL_RESOURCE_PATHS:
+            print(f"Optional resource missing: {missing}")
+            missing_optional.append(missing)
+        else:
             print(f"Resource missing: {missing}")
+            missing_files.append(missing)
+    if missing_files:
+        raise FileNotFoundError(f"{len(missing_files)} resources are missing: {', '.join(missing_files)}")
+    print("All required resources are found.")
+
+    previous = resource_manifest.load_manifest(manifest_path)
+    manifest = resource_manifest.build_manifest([path for path in file_paths if path not in missing_optional],
+                                                previous=previous)
+    resource_manifest.save_manifest(manifest, manifest_path)
+
+    game_build = manifest["game_build"]
+    if game_build:
+        print(f"Game build {game_build.get('version') or game_build.get('build')} (from {game_build['source']})")
+    print(f"Fingerprinted {len(manifest['files'])} resource files to {manifest_path}")
+    return manifest
 
 
 if __name__ == "__main__":
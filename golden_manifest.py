@@ -0,0 +1,241 @@
+import argparse
+import difflib
+import hashlib
+import json
+import os
+import sys
+
+from distribution_diff import SECTION_KEYS, index_rows
+from item_store import iter_items
+
+# Golden-output regression check.
+#
+# `record` stores a manifest of content hashes for a reference run: one per rendered table, one per
+# section of every item record and, for list sections, one per row keyed like `distribution_diff`
+# joins them. `verify` hashes a new run in a single pass and compares the two manifests, so checking
+# thousands of tables costs one read of each file. Details are only worked out for the items whose
+# hashes differ: which sections and which rows changed, plus a text diff of the table when the
+# reference tables are still around.
+
+MANIFEST_VERSION = 1
+DEFAULT_MANIFEST_PATH = "output/distributions/golden_manifest.json"
+DEFAULT_TABLES_DIR = "output/distributions/complete"
+DEFAULT_ITEMS_PATH = "output/distributions/json/all_items.json"
+DEFAULT_MISSING_PATH = "output/distributions/missing_items.txt"
+
+
+def content_hash(data):
+    """Short hash of bytes or text."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def value_hash(value):
+    return content_hash(json.dumps(value, sort_keys=True))
+
+
+def row_key(key):
+    return " / ".join(str(part) for part in key)
+
+
+def hash_record(record):
+    """
+    Hash every section of an item record.
+
+    :return: Dictionary of section name to its hash, and to a `{row key: hash}` dictionary under
+        "<section>.rows" for the sections in `distribution_diff.SECTION_KEYS`
+    """
+    hashes = {}
+    for section, value in record.items():
+        hashes[section] = value_hash(value)
+        if section in SECTION_KEYS and value:
+            key_fields, value_fields = SECTION_KEYS[section]
+            hashes[section + ".rows"] = {
+                row_key(key): value_hash(values)
+                for key, values in index_rows(value, key_fields, value_fields).items()
+            }
+    return hashes
+
+
+def hash_tables(tables_dir):
+    """Hash every `<item_id>.txt` table in `tables_dir`."""
+    hashes = {}
+    if not os.path.isdir(tables_dir):
+        return hashes
+    for entry in sorted(os.scandir(tables_dir), key=lambda entry: entry.name):
+        if entry.is_file() and entry.name.endswith(".txt"):
+            with open(entry.path, "rb") as table_file:
+                hashes[entry.name[:-len(".txt")]] = content_hash(table_file.read())
+    return hashes
+
+
+def build_manifest(tables_dir=DEFAULT_TABLES_DIR, items_path=DEFAULT_ITEMS_PATH, missing_path=DEFAULT_MISSING_PATH):
+    """Hash the tables, item records and missing item list of one run."""
+    records = {}
+    if os.path.exists(items_path):
+        records = {item_id: hash_record(record) for item_id, record in iter_items(items_path)}
+
+    missing = None
+    if os.path.exists(missing_path):
+        with open(missing_path, "rb") as missing_file:
+            missing = content_hash(missing_file.read())
+
+    return {
+        "version": MANIFEST_VERSION,
+        "tables": hash_tables(tables_dir),
+        "records": records,
+        "missing_items": missing,
+    }
+
+
+def diff_rows(old_rows, new_rows):
+    changes = {
+        "added": sorted(new_rows.keys() - old_rows.keys()),
+        "removed": sorted(old_rows.keys() - new_rows.keys()),
+        "changed": sorted(key for key in old_rows.keys() & new_rows.keys() if old_rows[key] != new_rows[key]),
+    }
+    return {kind: keys for kind, keys in changes.items() if keys}
+
+
+def diff_record_hashes(old_hashes, new_hashes):
+    """Name the sections, and rows of list sections, that differ between two hashed records."""
+    changes = {}
+    for section in sorted(old_hashes.keys() | new_hashes.keys()):
+        if section.endswith(".rows") or old_hashes.get(section) == new_hashes.get(section):
+            continue
+        rows_key = section + ".rows"
+        if section in SECTION_KEYS:
+            changes[section] = diff_rows(old_hashes.get(rows_key, {}), new_hashes.get(rows_key, {}))
+            # Same rows in a different order
+            if not changes[section]:
+                changes[section] = "reordered"
+        else:
+            changes[section] = "changed"
+    return changes
+
+
+def compare_manifests(reference, current):
+    """
+    Compare the manifest of a new run with the reference manifest.
+
+    :return: Report dictionary with a summary and one entry per mismatching item
+    """
+    old_tables, new_tables = reference["tables"], current["tables"]
+    old_records, new_records = reference["records"], current["records"]
+
+    items = {}
+
+    def entry(item_id):
+        return items.setdefault(item_id, {})
+
+    for item_id in old_tables.keys() - new_tables.keys():
+        entry(item_id)["table"] = "removed"
+    for item_id in new_tables.keys() - old_tables.keys():
+        entry(item_id)["table"] = "added"
+    for item_id in old_tables.keys() & new_tables.keys():
+        if old_tables[item_id] != new_tables[item_id]:
+            entry(item_id)["table"] = "changed"
+
+    for item_id in old_records.keys() - new_records.keys():
+        entry(item_id)["record"] = "removed"
+    for item_id in new_records.keys() - old_records.keys():
+        entry(item_id)["record"] = "added"
+    for item_id in old_records.keys() & new_records.keys():
+        if old_records[item_id] != new_records[item_id]:
+            entry(item_id)["record"] = diff_record_hashes(old_records[item_id], new_records[item_id])
+
+    missing_changed = reference.get("missing_items") != current.get("missing_items")
+    return {
+        "summary": {
+            "tables": len(new_tables),
+            "records": len(new_records),
+            "mismatched_items": len(items),
+            "missing_items_changed": missing_changed,
+        },
+        "items": dict(sorted(items.items())),
+    }
+
+
+def table_diff(reference_tables_dir, tables_dir, item_id):
+    """Unified diff of one table against the reference tables, if they are available."""
+    file_name = f"{item_id}.txt"
+    lines = []
+    for directory in (reference_tables_dir, tables_dir):
+        path = os.path.join(directory, file_name)
+        if os.path.exists(path):
+            with open(path, "r") as table_file:
+                lines.append(table_file.read().splitlines())
+        else:
+            lines.append([])
+    return list(difflib.unified_diff(lines[0], lines[1], f"reference/{file_name}", f"current/{file_name}",
+                                     lineterm=""))
+
+
+def print_report(report, reference_tables_dir=None, tables_dir=DEFAULT_TABLES_DIR):
+    summary = report["summary"]
+    for item_id, changes in report["items"].items():
+        print(f"{item_id}:")
+        if "table" in changes:
+            print(f"  table {changes['table']}")
+        record = changes.get("record")
+        if isinstance(record, str):
+            print(f"  record {record}")
+        elif record:
+            for section, section_changes in record.items():
+                if isinstance(section_changes, str):
+                    print(f"  {section}: {section_changes}")
+                    continue
+                for kind, keys in section_changes.items():
+                    for key in keys:
+                        print(f"  {section}: {kind} {key}")
+        if reference_tables_dir and changes.get("table") == "changed":
+            for line in table_diff(reference_tables_dir, tables_dir, item_id):
+                print("    " + line)
+
+    if summary["missing_items_changed"]:
+        print("missing_items.txt changed")
+    print(f"{summary['mismatched_items']} mismatching items out of {summary['tables']} tables "
+          f"and {summary['records']} records")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or verify a golden manifest of the generated output.")
+    parser.add_argument("command", choices=["record", "verify"],
+                        help="record: store the manifest of the current output; verify: compare against it")
+    parser.add_argument("manifest", nargs="?", default=DEFAULT_MANIFEST_PATH, help="Manifest path")
+    parser.add_argument("--tables", default=DEFAULT_TABLES_DIR, help="Folder with the rendered tables")
+    parser.add_argument("--items", default=DEFAULT_ITEMS_PATH, help="all_items.json of the run")
+    parser.add_argument("--missing", default=DEFAULT_MISSING_PATH, help="missing_items.txt of the run")
+    parser.add_argument("--reference-tables", help="Tables of the reference run, to print text diffs")
+    parser.add_argument("-o", "--output", help="Optionally write the verification report as JSON")
+    args = parser.parse_args(argv)
+
+    current = build_manifest(args.tables, args.items, args.missing)
+
+    if args.command == "record":
+        os.makedirs(os.path.dirname(args.manifest) or ".", exist_ok=True)
+        with open(args.manifest, "w") as manifest_file:
+            json.dump(current, manifest_file)
+        print(f"Recorded {len(current['tables'])} tables and {len(current['records'])} records to {args.manifest}")
+        return
+
+    with open(args.manifest, "r") as manifest_file:
+        reference = json.load(manifest_file)
+    if reference.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"{args.manifest} was recorded with manifest version {reference.get('version')}, "
+                         f"expected {MANIFEST_VERSION}; record it again")
+
+    report = compare_manifests(reference, current)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump(report, report_file, indent=4)
+
+    print_report(report, args.reference_tables, args.tables)
+    if report["items"] or report["summary"]["missing_items_changed"]:
+        sys.exit(1)
+    print("Output matches the golden manifest")
+
+
+if __name__ == "__main__":
+    main()
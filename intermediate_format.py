@@ -0,0 +1,226 @@
+import argparse
+import io
+import json
+import os
+import pickle
+import sys
+
+# Compact binary form of the JSON intermediates in `output/distributions/json/`.
+#
+# A `.pzbin` file holds the same data as its `.json` counterpart:
+#   - the magic bytes `PZDI` followed by a one byte format version
+#   - one pickle per top-level entry, written as `(key, value)`. Each entry has its own memo, so a
+#     repeated (interned) string is stored once per entry, and the writer never holds on to the
+#     entries it has already written
+#   - a final `None` pickle marking the end of the entries
+#
+# Version 1 files pickled every entry through one shared memo; they can still be read.
+#
+# Files can be converted both ways with `python3 intermediate_format.py <path>`.
+
+MAGIC = b"PZDI"
+FORMAT_VERSION = 2
+SHARED_MEMO_VERSION = 1
+BINARY_EXTENSION = ".pzbin"
+
+
+def binary_path_for(path):
+    """Return the `.pzbin` path that sits next to a `.json` (or `.jsonl`) intermediate."""
+    return os.path.splitext(path)[0] + BINARY_EXTENSION
+
+
+def json_path_for(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def is_binary(path):
+    return str(path).endswith(BINARY_EXTENSION)
+
+
+def resolve(path):
+    """
+    Pick the fastest up-to-date file for an intermediate.
+
+    When a `.pzbin` file exists next to the requested JSON file and is at least as new, the binary
+    file is used instead. Otherwise the path is returned unchanged.
+    """
+    if is_binary(path):
+        return path
+    binary_path = binary_path_for(path)
+    if os.path.exists(binary_path):
+        if not os.path.exists(path) or os.path.getmtime(binary_path) >= os.path.getmtime(path):
+            return binary_path
+    return path
+
+
+def intern_strings(obj):
+    """Recursively intern every string in a JSON-like structure."""
+    if isinstance(obj, str):
+        return sys.intern(obj)
+    if isinstance(obj, dict):
+        return {intern_strings(key): intern_strings(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [intern_strings(value) for value in obj]
+    return obj
+
+
+class BinaryWriter:
+    """
+    Writes the top-level entries of an intermediate one at a time.
+
+    :param path: File to write, or an open binary file such as `io.BytesIO`, which is left open
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.owns_file = isinstance(path, (str, os.PathLike))
+        self.file = open(path, "wb") if self.owns_file else path
+        self.closed = False
+        self.file.write(MAGIC + bytes([FORMAT_VERSION]))
+        self.pickler = pickle.Pickler(self.file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def write(self, key, value):
+        self.pickler.dump((intern_strings(key), intern_strings(value)))
+        self.pickler.clear_memo()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.pickler.dump(None)
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_entries(file, name):
+    """Yield the `(key, value)` entries of binary intermediate data read from `file`."""
+    header = file.read(len(MAGIC) + 1)
+    if header[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{name} is not a binary intermediate file")
+    version = header[len(MAGIC)]
+    if version not in (FORMAT_VERSION, SHARED_MEMO_VERSION):
+        raise ValueError(f"{name} uses format version {version}, expected {FORMAT_VERSION}")
+
+    if version == SHARED_MEMO_VERSION:
+        load = pickle.Unpickler(file).load
+    else:
+        def load():
+            return pickle.Unpickler(file).load()
+    while True:
+        entry = load()
+        if entry is None:
+            return
+        yield entry
+
+
+def iter_binary(path):
+    """Yield the `(key, value)` entries of a `.pzbin` file."""
+    with open(path, "rb") as file:
+        yield from read_entries(file, path)
+
+
+def encode_binary(data):
+    """The `.pzbin` form of an intermediate, as bytes."""
+    buffer = io.BytesIO()
+    with BinaryWriter(buffer) as writer:
+        for key, value in data.items():
+            writer.write(key, value)
+    return buffer.getvalue()
+
+
+def decode_binary(payload, name="binary data"):
+    """Inverse of `encode_binary`."""
+    return dict(read_entries(io.BytesIO(payload), name))
+
+
+def save_intermediate(data, path):
+    """Save a parsed intermediate as JSON or, for `.pzbin` paths, in the binary format."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if is_binary(path):
+        with BinaryWriter(path) as writer:
+            for key, value in data.items():
+                writer.write(key, value)
+    else:
+        with open(path, "w") as json_file:
+            json.dump(data, json_file, indent=4)
+
+
+def load_intermediate(path):
+    """
+    Load a parsed intermediate such as `proceduraldistributions.json`.
+
+    This is the single loading path for intermediates: an up-to-date `.pzbin` file next to the
+    JSON file is preferred, falling back to the JSON file itself.
+    """
+    path = resolve(path)
+    if is_binary(path):
+        return dict(iter_binary(path))
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def convert(source_path, destination_path=None):
+    """
+    Convert an intermediate between its JSON and binary forms.
+
+    :param source_path: The `.json` or `.pzbin` file to convert
+    :param destination_path: Output path, defaults to the same name with the other extension
+    :return: The path that was written
+    """
+    # Imported here as item_store itself uses this module for `.pzbin` items files
+    from item_store import ItemWriter, iter_items
+
+    if destination_path is None:
+        destination_path = json_path_for(source_path) if is_binary(source_path) else binary_path_for(source_path)
+
+    if source_path.endswith(".jsonl") or destination_path.endswith(".jsonl"):
+        # Items files in JSON Lines form are converted entry by entry
+        with ItemWriter(destination_path) as writer:
+            for key, value in iter_items(source_path):
+                writer.write(key, value)
+    elif is_binary(source_path):
+        save_intermediate(dict(iter_binary(source_path)), destination_path)
+    else:
+        with open(source_path, "r") as file:
+            save_intermediate(json.load(file), destination_path)
+
+    return destination_path
+
+
+def convert_directory(directory, to_binary=True):
+    """Convert every intermediate in a directory to the binary form, or back to JSON."""
+    converted = []
+    for file_name in sorted(os.listdir(directory)):
+        source_path = os.path.join(directory, file_name)
+        if to_binary and file_name.endswith(".json"):
+            converted.append(convert(source_path))
+        elif not to_binary and is_binary(file_name):
+            converted.append(convert(source_path))
+    return converted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert intermediates between JSON and the binary format.")
+    parser.add_argument("path", nargs="?", default="output/distributions/json",
+                        help="A .json/.pzbin file, or a directory of intermediates")
+    parser.add_argument("-o", "--output", help="Output file when converting a single file")
+    parser.add_argument("--to-json", action="store_true", help="Convert a directory of .pzbin files back to JSON")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.path):
+        converted = convert_directory(args.path, to_binary=not args.to_json)
+    else:
+        converted = [convert(args.path, args.output)]
+
+    for path in converted:
+        print("Written", path)
+
+
+if __name__ == "__main__":
+    main()
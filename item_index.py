@@ -0,0 +1,310 @@
+import re
+
+from item_names import normalize_name
+from loot_probability import CONTAINERS_PER_ROOM, ExactChanceCalculator
+from placement_records import (ContainerPlacement, VehiclePlacement, AttachedWeaponPlacement, OutfitPlacement,
+                               ItemRecord)
+from spill_store import MemoryMultimap
+
+# Read-only lookup data used to build every item's record in `Main.build_item_json`.
+#
+# Every source is indexed by item in one pass when the index is created, so building a record is a
+# handful of dictionary lookups with no work proportional to the size of any source. Records can be
+# built in worker processes: with the "fork" start method the index is shared copy-on-write,
+# otherwise it is pickled to each worker once when the pool starts.
+
+DEFAULT_CHUNK_SIZE = 256
+
+# Index of the worker process, set by `_init_worker`
+_worker_index = None
+
+
+def split_vehicle_label(label):
+    """
+    Split a VehicleDistributions label such as "TrunkStandard" into its vehicle type and container.
+
+    :return: Tuple of (vehicle_type, container)
+    """
+    vehicle_type, container, _ = match_vehicle_label(label)
+    return vehicle_type, container
+
+
+def match_vehicle_label(label):
+    """
+    Like `split_vehicle_label`, also naming the rule that matched the label.
+
+    Labels no specific rule knows end up in the "default" rule, which takes the first word as the
+    vehicle type; `distribution_analytics` lists them so new labels can be checked.
+
+    :return: Tuple of (vehicle_type, container, rule)
+    """
+    # Split the label using camel case
+    type_parts = re.findall(r'[A-Z][^A-Z]*', label)
+
+    # Apply specific rules to determine vehicle_type and container
+    if type_parts[0] == "Mc" and len(type_parts) > 1:
+        vehicle_type = type_parts[0] + type_parts[1]
+        container = ' '.join(type_parts[2:])
+        rule = "mc"
+    elif ' '.join(type_parts[:2]) == "Metal Welder" and len(type_parts) > 2:
+        vehicle_type = ' '.join(type_parts[:2])
+        container = ' '.join(type_parts[2:])
+        rule = "metal welder"
+    elif ' '.join(type_parts[:3]) == "Mass Gen Fac" and len(type_parts) > 3:
+        vehicle_type = ' '.join(type_parts[:3])
+        container = ' '.join(type_parts[3:])
+        rule = "mass gen fac"
+    elif ' '.join(type_parts[:2]) == "Construction Worker" and len(type_parts) > 2:
+        vehicle_type = ' '.join(type_parts[:2])
+        container = ' '.join(type_parts[2:])
+        rule = "construction worker"
+    elif type_parts[0] == "Glove" or ' '.join(type_parts[:2]) == "Glove box":
+        vehicle_type = "All"
+        container = ' '.join(type_parts)
+        rule = "glove box"
+    elif type_parts[0] == "Trunk":
+        vehicle_type = ' '.join(type_parts[1:])
+        container = type_parts[0]
+        rule = "trunk"
+    else:
+        vehicle_type = type_parts[0]
+        container = ' '.join(type_parts[1:])
+        rule = "default"
+
+    # Normalize container name for "Glovebox"
+    if container.lower() == "glovebox":
+        container = "Glove Box"
+
+    return vehicle_type, container, rule
+
+
+def entries(data):
+    """(key, value) pairs of a parsed source, given either as a dictionary or as an iterable of pairs."""
+    return data.items() if isinstance(data, dict) else data
+
+
+def index_foraging(foraging_data):
+    """
+    Map item names to the foraging parameters shown in the tables.
+
+    Definitions are found by their key, as before, and also by the item in their `type`, so
+    definitions keyed by another name or carrying a module prefix are no longer missed.
+    """
+    parameters = [
+        "skill", "chance", "zones", "categories", "xp", "minCount",
+        "maxCount", "months", "bonusMonths", "malusMonths",
+        "snowChance", "rainChance", "dayChance", "nightChance"
+    ]
+
+    definitions = dict(foraging_data)
+    for key, item_info in foraging_data.items():
+        definitions.setdefault(normalize_name(item_info.get("type") or key), item_info)
+
+    foraging_info = {}
+    for item_name, item_info in definitions.items():
+        relevant_data = {param: item_info[param] for param in parameters if param in item_info}
+        foraging_info[item_name] = relevant_data
+    return foraging_info
+
+
+def index_attached_weapons(attached_weapons_data):
+    """Map item names to their attached weapon placements, one per outfit of each matching definition."""
+    hits = {}
+    for weapon_config, details in attached_weapons_data.items():
+        # Assign "Any" to outfit if it isn't specified in the details
+        outfits = details.get("outfit", "Any")
+        day_survived = details.get("daySurvived", 0)
+        chance = details.get("chance", 0)
+
+        # Ensure `outfits` is a list even if set to "Any"
+        if not isinstance(outfits, list):
+            outfits = [outfits]
+
+        placements = [AttachedWeaponPlacement(outfit, day_survived, chance) for outfit in outfits]
+        # A weapon listed twice in one definition still only matches it once
+        for weapon in dict.fromkeys(map(normalize_name, details.get("weapons", []))):
+            hits.setdefault(weapon, []).extend(placements)
+    return hits
+
+
+def index_clothing(clothing_data):
+    """Map item names to the outfits they are worn in, female outfits first."""
+    hits = {}
+    for gender_outfits in ["FemaleOutfits", "MaleOutfits"]:
+        for outfit_name, outfit_details in clothing_data.get(gender_outfits, {}).items():
+            guid = outfit_details.get("GUID", "")
+            for item_name, chance in outfit_details.get("Items", {}).items():
+                hits.setdefault(normalize_name(item_name), []).append(OutfitPlacement(guid, outfit_name, chance))
+    return hits
+
+
+def index_stories(stories_data):
+    """Map item names to the stories that spawn them."""
+    hits = {}
+    for story_category, items in stories_data.items():
+        for item_name in dict.fromkeys(map(normalize_name, items)):
+            hits.setdefault(item_name, []).append(story_category)
+    return hits
+
+
+class ItemIndex:
+    """
+    Lookup data for building item records from the parsed distributions.
+
+    Usage:
+        index = ItemIndex(procedural_data, distribution_data, vehicle_data, foraging_data,
+                          attached_weapons_data, clothing_data, stories_data)
+        record = index.build_record("Axe")
+
+    Passing `store` keeps the container and vehicle indexes in a `spill_store.SpillStore` instead of
+    in memory.
+    """
+
+    def __init__(self, procedural_data, distribution_data, vehicle_data, foraging_data, attached_weapons_data,
+                 clothing_data, stories_data, exact_chances=False, store=None,
+                 containers_per_room=CONTAINERS_PER_ROOM):
+        self.calculator = (ExactChanceCalculator(procedural_data, distribution_data, containers_per_room)
+                           if exact_chances else None)
+
+        # The three large indexes go to disk when a `spill_store.SpillStore` is given; the large
+        # sources may then also be iterables of (key, value) pairs, e.g. from `item_store.iter_items`
+        def multimap(name):
+            return store.multimap(name) if store is not None else MemoryMultimap()
+
+        # Rooms and containers using each procedural list, in distribution order
+        self.list_placements = multimap("list_placements")
+        for room, room_content in entries(distribution_data):
+            for container, container_content in room_content.items():
+                for proc_entry in container_content.get("procList", []):
+                    self.list_placements.add(proc_entry.get("name"), (room, container))
+
+        # Procedural list entries of each item, in list order
+        self.list_entries = multimap("list_entries")
+        self.procedural_lists = set()
+        for proclist, content in entries(procedural_data):
+            # Non-procedural rooms are stored alongside the procedural lists, without items or rolls
+            if "items" in content or "rolls" in content:
+                self.procedural_lists.add(proclist)
+            rolls = content.get("rolls", 0)
+            for entry in content.get("items", []):
+                self.list_entries.add(normalize_name(entry["name"]), (proclist, entry["chance"], rolls))
+
+        # Vehicle hits of each item, as (label, chance, rolls); regular items come before junk items of
+        # the same label. Everything else about a label is kept once, in the lookups below
+        self.vehicle_hits = multimap("vehicle_hits")
+        # Vehicle type and container, and the rule of `match_vehicle_label` used, for each label
+        self.vehicle_containers = {}
+        self.vehicle_label_rules = {}
+        for label, details in entries(vehicle_data):
+            vehicle_type, container, self.vehicle_label_rules[label] = match_vehicle_label(label)
+            self.vehicle_containers[label] = (vehicle_type, container)
+            if self.calculator:
+                self.calculator.add_vehicle(label, details)
+            rolls = details.get("rolls", 0)
+            for items in (details.get("items", {}), details.get("junk", {}).get("items", {})):
+                for item_name, chance in items.items():
+                    self.vehicle_hits.add(normalize_name(item_name), (label, chance, rolls))
+
+        for index in (self.list_placements, self.list_entries, self.vehicle_hits):
+            index.finish()
+
+        self.foraging_info = index_foraging(foraging_data)
+        self.attached_weapon_hits = index_attached_weapons(attached_weapons_data)
+        self.clothing_hits = index_clothing(clothing_data)
+        self.story_hits = index_stories(stories_data)
+
+    def get_container_info(self, item_name):
+        containers_info = []
+        calculator = self.calculator
+        for proclist, chance, rolls in self.list_entries.get(item_name, ()):
+            for room, container in self.list_placements.get(proclist, ()):
+                exact_chance = None
+                if calculator:
+                    exact_chance = calculator.container_chance(item_name, room, container, proclist)
+                containers_info.append(ContainerPlacement(room, container, proclist, chance, rolls, exact_chance))
+        return containers_info
+
+    def get_vehicle_info(self, item_name):
+        vehicles_info = []
+        for label, chance, rolls in self.vehicle_hits.get(item_name, ()):
+            vehicle_type, container = self.vehicle_containers[label]
+            exact_chance = None
+            if self.calculator:
+                exact_chance = self.calculator.vehicle_chance(item_name, label)
+            vehicles_info.append(VehiclePlacement(vehicle_type, container, chance, rolls, exact_chance))
+        return vehicles_info
+
+    def get_foraging_info(self, item_name):
+        return self.foraging_info.get(item_name, {})
+
+    def get_attached_weapon_info(self, item_name):
+        return list(self.attached_weapon_hits.get(item_name, ()))
+
+    def get_clothing_info(self, item_name):
+        return list(self.clothing_hits.get(item_name, ()))
+
+    def get_story_info(self, item_name):
+        return list(self.story_hits.get(item_name, ()))
+
+    def build_record(self, item_name):
+        return ItemRecord(
+            name=item_name,
+            containers=self.get_container_info(item_name),
+            vehicles=self.get_vehicle_info(item_name),
+            foraging=self.get_foraging_info(item_name),
+            attached_weapon=self.get_attached_weapon_info(item_name),  # Assign attached weapon info
+            clothing=self.get_clothing_info(item_name),
+            stories=self.get_story_info(item_name)
+        )
+
+
+def _init_worker(index=None):
+    global _worker_index
+    if index is not None:
+        _worker_index = index
+
+
+def _build_chunk(item_names):
+    return [(item_name, _worker_index.build_record(item_name).to_json()) for item_name in item_names]
+
+
+def build_records(index, item_names, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Build the JSON records of `item_names`, yielding `(item_name, record)` in the order given.
+
+    :param index: The `ItemIndex` to build from
+    :param item_names: Ordered list of item names
+    :param workers: Number of worker processes; records are built in this process when 1 or None
+    :param chunk_size: Number of items handed to a worker at a time
+    :param progress: Optional callable receiving the number of items finished
+    """
+    if not workers or workers <= 1:
+        for item_name in item_names:
+            yield item_name, index.build_record(item_name).to_json()
+            if progress:
+                progress(1)
+        return
+
+    import multiprocessing
+
+    global _worker_index
+    chunks = [item_names[start:start + chunk_size] for start in range(0, len(item_names), chunk_size)]
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        # Forked workers inherit the index from this process without copying it
+        context = multiprocessing.get_context("fork")
+        _worker_index = index
+        initargs = ()
+    else:
+        context = multiprocessing.get_context("spawn")
+        initargs = (index,)
+
+    try:
+        with context.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+            # imap keeps the chunk order, so the output is the same as a serial build
+            for chunk_records in pool.imap(_build_chunk, chunks):
+                yield from chunk_records
+                if progress:
+                    progress(len(chunk_records))
+    finally:
+        _worker_index = None
@@ -0,0 +1,87 @@
+import sys
+
+# The one place item names are normalized.
+#
+# The game refers to items by their full type ("Base.Axe", "Radio.WalkieTalkie1", "ModA.Wok") while the
+# wiki and the item records use the bare name. Every parser and `build_item_json` strip the module
+# through `normalize_name`, so they all agree on what an item is called. Results are memoized in a
+# bounded cache and interned, so the thousands of repeated names share one string each.
+#
+# Earlier code stripped only the "Base.", "Radio." and "Farming." modules in some places, and nothing
+# at all in others. The first time a name is seen it is checked against those methods, and the names
+# they would have got wrong are counted, to show what the shared normalizer changed.
+
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Modules removed by the older prefix stripping
+KNOWN_MODULES = ("Base.", "Radio.", "Farming.")
+
+
+def strip_known_module(name):
+    """Older stripping: remove "Base.", "Radio." or "Farming." only."""
+    for prefix in KNOWN_MODULES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+
+class NameNormalizer:
+    """
+    Cached module stripping, e.g. "Base.Axe" -> "Axe".
+
+    :param max_entries: Number of distinct names kept, and of names kept per older method in
+        `disagreements`; once full, new names are normalized without being stored
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.names = {}
+        self.hits = 0
+        self.misses = 0
+        # Older method name to the names it would have normalized differently, at most max_entries each
+        self.disagreements = {"known_modules": set(), "unstripped": set()}
+
+    def normalize(self, name):
+        """Name without its module, or `name` itself when it has none or isn't a string."""
+        normalized = self.names.get(name)
+        if normalized is not None:
+            self.hits += 1
+            return normalized
+        if not isinstance(name, str):
+            return name
+
+        self.misses += 1
+        normalized = sys.intern(name.split('.', 1)[1] if '.' in name else name)
+        if strip_known_module(name) != normalized:
+            self._add_disagreement("known_modules", name)
+        if name != normalized:
+            self._add_disagreement("unstripped", name)
+        if len(self.names) < self.max_entries:
+            self.names[name] = normalized
+        return normalized
+
+    __call__ = normalize
+
+    def _add_disagreement(self, method, name):
+        names = self.disagreements[method]
+        if len(names) < self.max_entries:
+            names.add(name)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disagreements": {method: len(names) for method, names in self.disagreements.items()},
+        }
+
+    def summary(self):
+        stats = self.stats()
+        disagreements = stats["disagreements"]
+        return (f"Item names: {stats['hits']} cache hits, {stats['misses']} cache misses, "
+                f"{disagreements['known_modules']} stripped differently than by known modules only, "
+                f"{disagreements['unstripped']} with a module prefix")
+
+
+# Shared by everything in one process
+NORMALIZER = NameNormalizer()
+normalize_name = NORMALIZER.normalize
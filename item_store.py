@@ -0,0 +1,181 @@
+import json
+import intermediate_format
+
+# Item-at-a-time reading and writing of `all_items` data.
+#
+# Three layouts are supported, chosen by file extension:
+#   - `.json`: the usual `all_items.json` object, written with `indent=4` exactly like `json.dump`
+#   - `.jsonl`: JSON Lines, one `{"<item_id>": {...}}` object per line
+#   - `.pzbin`: the binary intermediate format from `intermediate_format`
+#
+# Neither the writer nor the readers hold more than one item in memory, so building and rendering
+# the whole catalogue stays flat in memory regardless of its size.
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Characters that may follow an item id or a record in the top-level object
+VALUE_FOLLOWERS = frozenset(" \t\r\n:,}")
+
+
+def is_json_lines(path):
+    return str(path).endswith(".jsonl")
+
+
+class ItemWriter:
+    """
+    Writes item records to disk one at a time.
+
+    Usage:
+        with ItemWriter("output/distributions/json/all_items.json") as writer:
+            writer.write(item_id, record)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.json_lines = is_json_lines(path)
+        self.count = 0
+        if intermediate_format.is_binary(path):
+            self.binary_writer = intermediate_format.BinaryWriter(path)
+            return
+        self.binary_writer = None
+        self.file = open(path, "w")
+        if not self.json_lines:
+            self.file.write("{")
+
+    def write(self, item_id, record):
+        if self.binary_writer:
+            self.binary_writer.write(item_id, record)
+        elif self.json_lines:
+            self.file.write(json.dumps({item_id: record}))
+            self.file.write("\n")
+        else:
+            # Dump the single-entry object and strip its braces, which leaves the entry indented exactly
+            # as `json.dump(all_items, indent=4)` would have written it
+            entry = json.dumps({item_id: record}, indent=4)[2:-2]
+            self.file.write(",\n" if self.count else "\n")
+            self.file.write(entry)
+        self.count += 1
+
+    def close(self):
+        if self.binary_writer:
+            self.binary_writer.close()
+            return
+        if self.file.closed:
+            return
+        if not self.json_lines:
+            self.file.write("\n}" if self.count else "}")
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_items(path):
+    """
+    Yield `(item_id, record)` pairs from an items file without loading the whole file.
+
+    An up-to-date `.pzbin` file next to the requested file is read instead, see `intermediate_format.resolve`.
+
+    :param path: Path to an `all_items.json`, `all_items.jsonl` or `all_items.pzbin` file
+    """
+    path = intermediate_format.resolve(path)
+    if intermediate_format.is_binary(path):
+        yield from intermediate_format.iter_binary(path)
+    elif is_json_lines(path):
+        yield from _iter_json_lines(path)
+    else:
+        yield from _iter_json_object(path)
+
+
+def load_items(path):
+    """Load a whole items file into a dictionary keyed by item id."""
+    return dict(iter_items(path))
+
+
+def _iter_json_lines(path):
+    with open(path, "r") as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if not isinstance(entry, dict) or len(entry) != 1:
+                raise ValueError(f"{path}:{line_number}: expected a single-item object")
+            yield next(iter(entry.items()))
+
+
+def _iter_json_object(path):
+    """Incrementally decode the members of a top-level JSON object."""
+    decoder = json.JSONDecoder()
+
+    with open(path, "r") as file:
+        buffer = ""
+        position = 0
+        eof = False
+
+        def fill():
+            # Drop consumed input and append the next chunk; returns False once the file is exhausted
+            nonlocal buffer, position, eof
+            if eof:
+                return False
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[position:] + chunk
+            position = 0
+            return True
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position] in " \t\r\n":
+                    position += 1
+                if position < len(buffer) or not fill():
+                    return
+
+        def expect(character):
+            nonlocal position
+            skip_whitespace()
+            if position >= len(buffer) or buffer[position] != character:
+                found = buffer[position:position + 20] if position < len(buffer) else "end of file"
+                raise ValueError(f"{path}: expected '{character}' but found {found!r}")
+            position += 1
+
+        def decode_value():
+            nonlocal position
+            skip_whitespace()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The value may just be cut off by the end of the buffer
+                    if fill():
+                        continue
+                    raise
+                # A number cut off by the end of the buffer decodes as a shorter one ("-0" of "-0.0025"),
+                # so a value only counts once what follows it is in the buffer too
+                if not eof and (end == len(buffer) or buffer[end] not in VALUE_FOLLOWERS) and fill():
+                    continue
+                position = end
+                return value
+
+        expect("{")
+        skip_whitespace()
+        if position < len(buffer) and buffer[position] == "}":
+            return
+
+        while True:
+            item_id = decode_value()
+            if not isinstance(item_id, str):
+                raise ValueError(f"{path}: expected an item id but found {item_id!r}")
+            expect(":")
+            yield item_id, decode_value()
+
+            skip_whitespace()
+            if position < len(buffer) and buffer[position] == "}":
+                return
+            expect(",")
@@ -0,0 +1,150 @@
+import os
+import re
+
+from item_store import iter_items
+from location_table import render_table, table_layout, RenderMemo
+from table_writer import TableWriter
+
+# Location tables and missing item reports for every translated wiki.
+#
+# The distributions are parsed and `all_items.json` is built once. Each language then only needs a
+# render pass over that file using its own `ItemName_XX.txt`, and the passes for all languages run
+# at the same time in worker processes. The locations themselves are the same in every language, so
+# a language's tables differ from the English ones by the translated item name given to the template
+# as `name=`. Output goes to `output/distributions/locales/<XX>/`.
+
+RESOURCES_DIR = "resources"
+LOCALES_OUTPUT_DIR = "output/distributions/locales"
+
+# `ItemName_FR.txt`, `ItemName_PTBR.txt`, ... but not the lowercase `itemname_en.txt` dictionary
+ITEM_NAME_FILE_PATTERN = re.compile(r"^ItemName_([A-Za-z]+)\.txt$")
+
+# Code page of the translations that aren't saved as UTF-8; any other language falls back to Cp1252
+LOCALE_ENCODINGS = {
+    "CS": "cp1250",
+    "HU": "cp1250",
+    "PL": "cp1250",
+    "RU": "cp1251",
+    "UA": "cp1251",
+    "TR": "cp1254",
+}
+
+
+def find_item_name_files(resources_dir=RESOURCES_DIR):
+    """
+    Find the item name translations in `resources_dir`.
+
+    :return: Dictionary of locale code ("EN", "FR", ...) to file path, sorted by code
+    """
+    files = {}
+    if not os.path.isdir(resources_dir):
+        return files
+    for file_name in sorted(os.listdir(resources_dir)):
+        match = ITEM_NAME_FILE_PATTERN.match(file_name)
+        if match:
+            files[match.group(1).upper()] = os.path.join(resources_dir, file_name)
+    return files
+
+
+def read_translation(path):
+    """
+    Text of a translation file.
+
+    Translations aren't all saved with the same encoding: UTF-8 is tried first, then the code page of
+    the file's language from `LOCALE_ENCODINGS`, replacing any byte it can't decode.
+    """
+    with open(path, "rb") as file:
+        raw = file.read()
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        match = ITEM_NAME_FILE_PATTERN.match(os.path.basename(path))
+        locale = match.group(1).upper() if match else None
+        return raw.decode(LOCALE_ENCODINGS.get(locale, "cp1252"), errors="replace")
+
+
+def load_item_names(itemname_path):
+    """Read an `ItemName_XX.txt` file into a dictionary of item id to translated name."""
+    item_names = {}
+    for line in read_translation(itemname_path).splitlines():
+        # Check for lines that contain both '.' and '='
+        if '.' in line and '=' in line:
+            # Remove the part before and including the first period, then split by '='
+            key = line.split('.')[1].split('=')[0].strip()
+            # `ItemName_Base.Axe = "Axe",`
+            value = line.split('=', 1)[1].strip().rstrip(',').strip().strip('"')
+            item_names[key] = value
+    return item_names
+
+
+def write_missing_items(item_names, item_list, missing_items_path):
+    """Write the ids in `item_names` that aren't in `item_list`, in file order."""
+    os.makedirs(os.path.dirname(missing_items_path) or ".", exist_ok=True)
+    missing = [key for key in item_names if key not in item_list]
+    with open(missing_items_path, "w") as output_file:
+        for key in missing:
+            output_file.write(f"{key}\n")
+    return len(missing)
+
+
+def render_locale(locale, itemname_path, items_path, item_list, output_dir=LOCALES_OUTPUT_DIR, chance_mode="formula",
+                  aggregate=None, top_rows=None):
+    """
+    Render the tables and missing item report of one language.
+
+    Tables are only written for items the language has a name for, with that name as `name=`.
+
+    :param item_list: Set of item ids found in the distributions
+    :param aggregate: Optional aggregation of the container and vehicle rows, see `location_table.table_layout`
+    :param top_rows: Optional number of container and vehicle rows kept per table
+    :return: Tuple of (locale, tables written, missing items)
+    """
+    item_names = load_item_names(itemname_path)
+    sections = table_layout(chance_mode, aggregate, top_rows)
+
+    locale_dir = os.path.join(output_dir, locale)
+
+    memo = RenderMemo()
+    with TableWriter(os.path.join(locale_dir, "complete")) as writer:
+        for item_id, item_data in iter_items(items_path):
+            if item_id in item_names:
+                writer.write(item_id, render_table(item_id, item_data, sections, memo, name=item_names[item_id]))
+    tables = writer.written
+
+    missing = write_missing_items(item_names, item_list, os.path.join(locale_dir, "missing_items.txt"))
+    return locale, tables, missing
+
+
+def render_locales(items_path, itemlist_path, locales=None, resources_dir=RESOURCES_DIR,
+                   output_dir=LOCALES_OUTPUT_DIR, chance_mode="formula", jobs=None, aggregate=None, top_rows=None):
+    """
+    Render the tables and missing item reports of several languages concurrently.
+
+    :param locales: Locale codes to render, defaults to every `ItemName_XX.txt` in `resources_dir`
+    :param jobs: Number of languages rendered at once, defaults to the number of cores
+    :return: Dictionary of locale code to (tables written, missing items)
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    item_name_files = find_item_name_files(resources_dir)
+    if locales:
+        locales = [locale.upper() for locale in locales]
+        unknown = [locale for locale in locales if locale not in item_name_files]
+        if unknown:
+            raise FileNotFoundError(f"No ItemName file in {resources_dir} for: {', '.join(unknown)}")
+        item_name_files = {locale: item_name_files[locale] for locale in locales}
+
+    with open(itemlist_path, "r") as item_list_file:
+        item_list = {line.strip() for line in item_list_file}
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(render_locale, locale, path, items_path, item_list, output_dir, chance_mode,
+                                   aggregate, top_rows)
+                   for locale, path in item_name_files.items()]
+        for future in as_completed(futures):
+            locale, tables, missing = future.result()
+            results[locale] = (tables, missing)
+            print(f"[{locale}] {tables} tables, {missing} missing items")
+
+    return dict(sorted(results.items()))
@@ -0,0 +1,405 @@
+import hashlib
+import operator
+from loot_probability import formula_chance
+
+# Template engine for the `{{Location table}}` wikitext written by `Main.build_tables`.
+#
+# The table layout is plain data: every section names the item data key it reads, the template
+# parameter it fills and its columns. Each section's row format is compiled once into a single
+# `str.format` call, and a whole table is rendered into one list buffer that is joined at the end.
+# Adding a column only means adding a `Column` to the section below.
+#
+# Many items (ammo variants, clothing colours, junk) have exactly the same placements. A `RenderMemo`
+# keys every rendered section by its data, so identical sections are formatted only once.
+#
+# Common junk can be found in hundreds of room/container combinations. `table_layout` can swap the
+# container and vehicle sections for `AggregatedSection`s, which group those rows by container or by
+# room, merge the rows of a group that share a chance, sort by chance and optionally keep only the
+# top rows plus one summary row.
+
+# Bump when the rendered wikitext changes in a way `render_cache` can't see, e.g. a template on the wiki
+TEMPLATE_VERSION = 1
+
+ROW_PREFIX = "{{!}} "
+CELL_SEPARATOR = " {{!}}{{!}} "
+ROW_SEPARATOR = "\n{{!}}-\n"
+
+MONTH_NAMES = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+
+
+class Column:
+    """
+    One column of a section.
+
+    :param value: Key to read from the row, or a function taking the row and returning the value
+    :param link: Wrap the value in `{{ll|...}}`
+    :param suffix: Text written straight after the value, e.g. "%"
+    """
+
+    def __init__(self, value, link=False, suffix=""):
+        self.value = value
+        self.link = link
+        self.suffix = suffix
+
+
+class Section:
+    """
+    One `|param=` section of the Location table.
+
+    :param key: Key of the section data in the item record
+    :param param: Template parameter the rows are written to
+    :param columns: List of `Column`
+    :param single: The section data is one row (a dict) instead of a list of rows
+    :param cell_separator: Text written between two cells of a row
+    """
+
+    def __init__(self, key, param, columns, single=False, cell_separator=CELL_SEPARATOR):
+        self.key = key
+        self.param = param
+        self.columns = columns
+        self.single = single
+        self.cell_separator = cell_separator
+        self.header = f"\n|{param}=\n"
+        self.format_row, self.get_values = self.compile()
+
+    def compile(self):
+        """Build the row format string and the function extracting its values from a row."""
+        cells = []
+        for index, column in enumerate(self.columns):
+            cell = f"{{{index}}}"
+            if column.link:
+                cell = "{{{{ll|" + cell + "}}}}"
+            cells.append(cell + column.suffix.replace("{", "{{").replace("}", "}}"))
+
+        escape = lambda text: text.replace("{", "{{").replace("}", "}}")
+        row_format = escape(ROW_PREFIX) + escape(self.cell_separator).join(cells)
+
+        getters = [column.value for column in self.columns]
+        if all(isinstance(getter, str) for getter in getters):
+            # Plain keys only, so a single itemgetter pulls the whole row out at C speed
+            item_getter = operator.itemgetter(*getters)
+            get_values = item_getter if len(getters) > 1 else lambda row: (item_getter(row),)
+        else:
+            getters = [operator.itemgetter(getter) if isinstance(getter, str) else getter for getter in getters]
+            get_values = lambda row: [getter(row) for getter in getters]
+
+        return row_format.format, get_values
+
+    def render(self, data, buffer):
+        """Append the section to `buffer`; rows are separated with `{{!}}-`."""
+        rows = [data] if self.single else data
+        format_row = self.format_row
+        get_values = self.get_values
+
+        buffer.append(self.header)
+        first = True
+        for row in rows:
+            if not first:
+                buffer.append(ROW_SEPARATOR)
+            buffer.append(format_row(*get_values(row)))
+            first = False
+
+
+class AggregatedSection(Section):
+    """
+    Container or vehicle section rendered through `aggregate_rows`.
+
+    :param place_key: "Room" for containers, "Type" for vehicles
+    :param chance: Function giving the chance of a row
+    :param group_by: One of `AGGREGATE_MODES`
+    :param top_rows: Optional number of rows kept before the summary row
+    """
+
+    def __init__(self, key, param, place_key, chance, group_by="container", top_rows=None):
+        self.place_key = place_key
+        self.chance = chance
+        self.group_by = group_by
+        self.top_rows = top_rows
+        super().__init__(key, param, [Column("Place"), Column("Container"), Column("Chance", suffix="%")])
+
+    def render(self, data, buffer):
+        super().render(aggregate_rows(data, self.place_key, self.group_by, self.chance, self.top_rows), buffer)
+
+
+class RenderMemo:
+    """
+    Cache of rendered sections, keyed by the section layout and a digest of the section data.
+
+    :param max_entries: Number of distinct sections kept; once full, new sections are rendered
+        without being stored
+    """
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self.texts = {}
+        self.hits = {}
+        self.misses = {}
+
+    @staticmethod
+    def data_key(data):
+        # Records always list their fields in the order `placement_records` writes them, so the repr is
+        # a canonical form that is much cheaper to get than sorting keys; equal reprs mean equal data.
+        # Only its 16 byte digest is kept, not the repr of every large section
+        return hashlib.blake2b(repr(data).encode("utf-8"), digest_size=16).digest()
+
+    def render(self, section, data, buffer):
+        """Append the section to `buffer`, reusing the text of an identical section rendered before."""
+        key = (section, self.data_key(data))
+        text = self.texts.get(key)
+        if text is not None:
+            self.hits[section.param] = self.hits.get(section.param, 0) + 1
+            buffer.append(text)
+            return
+
+        self.misses[section.param] = self.misses.get(section.param, 0) + 1
+        section_buffer = []
+        section.render(data, section_buffer)
+        text = "".join(section_buffer)
+        if len(self.texts) < self.max_entries:
+            self.texts[key] = text
+        buffer.append(text)
+
+    def stats(self):
+        """Hits and misses per template parameter, plus the totals under "total"."""
+        stats = {param: {"hits": self.hits.get(param, 0), "misses": self.misses.get(param, 0)}
+                 for param in sorted(self.hits.keys() | self.misses.keys())}
+        stats["total"] = {"hits": sum(self.hits.values()), "misses": sum(self.misses.values())}
+        return stats
+
+    def summary(self):
+        total = self.stats()["total"]
+        lookups = total["hits"] + total["misses"]
+        rate = total["hits"] / lookups * 100 if lookups else 0
+        return f"Render memo: {total['hits']} hits, {total['misses']} misses ({rate:.1f}% reused)"
+
+
+def effective_chance(row):
+    """Chance in percent of finding the item at least once, from its list chance and number of rolls."""
+    return formula_chance(row["Chance"], row["Rolls"])
+
+
+def exact_chance(row):
+    """Chance in percent from `loot_probability.ExactChanceCalculator`, falling back to the formula."""
+    chance = row.get("ExactChance")
+    return effective_chance(row) if chance is None else chance
+
+
+# Aggregation modes: the rows are grouped by this column and list the values of the other one
+AGGREGATE_MODES = ("container", "room")
+
+# Name of the places listed in the summary row, by the key of the first column
+PLACE_NAMES = {"Room": "rooms", "Type": "vehicle types"}
+
+
+def aggregate_rows(rows, place_key, group_by="container", chance=effective_chance, top_rows=None):
+    """
+    Collapse container or vehicle rows into fewer, larger rows.
+
+    With `group_by="container"` each row is one container and chance, listing every room (or vehicle
+    type) it is found in with that chance; with `group_by="room"` each row is one room and chance,
+    listing its containers. Rows are sorted by chance, highest first.
+
+    :param rows: Rows of the `Containers` or `Vehicles` section
+    :param place_key: "Room" for containers, "Type" for vehicles
+    :param chance: Function giving the chance of a row
+    :param top_rows: Keep this many rows and summarise the rest in a last row
+    :return: List of `{"Place", "Container", "Chance"}` rows holding the text of each cell
+    """
+    merged = {}
+    for row in rows:
+        value = chance(row)
+        if group_by == "room":
+            key, member = (row[place_key], value), row["Container"]
+        else:
+            key, member = (row["Container"], value), row[place_key]
+        members = merged.setdefault(key, [])
+        if member not in members:
+            members.append(member)
+
+    # sorted() is stable, so equal chances keep the order of the placements
+    groups = sorted(merged.items(), key=lambda group: group[0][1], reverse=True)
+    rest = []
+    if top_rows and len(groups) > top_rows + 1:
+        groups, rest = groups[:top_rows], groups[top_rows:]
+
+    aggregated = []
+    for (name, value), members in groups:
+        if group_by == "room":
+            aggregated.append({"Place": name, "Container": ", ".join(f"{{{{ll|{member}}}}}" for member in members),
+                               "Chance": value})
+        else:
+            aggregated.append({"Place": ", ".join(members), "Container": f"{{{{ll|{name}}}}}", "Chance": value})
+
+    if rest:
+        places = set()
+        containers = set()
+        for (name, value), members in rest:
+            if group_by == "room":
+                places.add(name)
+                containers.update(members)
+            else:
+                containers.add(name)
+                places.update(members)
+        lowest, highest = rest[-1][0][1], rest[0][0][1]
+        aggregated.append({
+            "Place": f"''{len(rest)} more: {len(places)} {PLACE_NAMES.get(place_key, 'places')}''",
+            "Container": f"''{len(containers)} containers''",
+            "Chance": highest if lowest == highest else f"{lowest}-{highest}",
+        })
+    return aggregated
+
+
+def story_link(story):
+    # Determine the link based on the prefix of the story
+    if story.startswith("RZS"):
+        return "Zone stories"
+    elif story.startswith("RBTS"):
+        return "Table stories"
+    elif story.startswith("RB"):
+        return "Building stories"
+    elif story.startswith("RVS"):
+        return "Vehicle stories"
+    return "Randomized stories"
+
+
+def format_months(month_obj):
+    """Convert month indexes to a readable "X to Y" range, or "-" when there are none."""
+    sorted_keys = sorted(map(int, month_obj.keys()))
+
+    if not sorted_keys:
+        return "-"
+
+    start_month = MONTH_NAMES[sorted_keys[0] - 1]
+    end_month = MONTH_NAMES[sorted_keys[-1] - 1]
+
+    return f"{start_month} to {end_month}" if start_month != end_month else start_month
+
+
+def foraging_amount(foraging_data):
+    min_count = foraging_data.get("minCount")
+    max_count = foraging_data.get("maxCount")
+    amount = f"{min_count}-{max_count}" if min_count is not None and max_count is not None else "-"
+
+    if amount == "---" or amount == "-":
+        amount = "1"
+    return amount
+
+
+def foraging_biomes(foraging_data):
+    # Biomes are separated with line breaks if multiple zones exist
+    zones = foraging_data.get("zones", {})
+    return "<br>".join([f"{zone}: {value}" for zone, value in zones.items()]) if zones else "-"
+
+
+def foraging_value(key):
+    return lambda foraging_data: foraging_data.get(key, "-")
+
+
+def foraging_months(key):
+    return lambda foraging_data: format_months(foraging_data.get(key, {}))
+
+
+LOCATION_TABLE = [
+    Section("Containers", "container", [
+        Column("Room"),
+        Column("Container", link=True),
+        Column(effective_chance, suffix="%"),
+    ]),
+    Section("Vehicles", "vehicle", [
+        Column("Type"),
+        Column("Container", link=True),
+        Column(effective_chance, suffix="%"),
+    ]),
+    Section("AttachedWeapon", "zombie", [
+        Column("outfit"),
+        Column(lambda weapon: weapon.get("daySurvived", 0)),
+        Column(lambda weapon: weapon.get("chance", 0)),
+    ]),
+    Section("Clothing", "outfit", [
+        Column("Outfit"),
+        Column("Chance"),
+        Column("GUID"),
+    ]),
+    Section("Stories", "stories", [
+        Column(lambda story: story),
+        Column(story_link, link=True),
+    ]),
+    Section("Foraging", "foraging", [
+        Column(foraging_amount),
+        Column(foraging_value("skill")),
+        Column(foraging_biomes),
+        Column(foraging_value("snowChance")),
+        Column(foraging_value("rainChance")),
+        Column(foraging_value("dayChance")),
+        Column(foraging_value("nightChance")),
+        Column(foraging_months("months")),
+        Column(foraging_months("bonusMonths")),
+        Column(foraging_months("malusMonths")),
+    ], single=True, cell_separator=" {{!}}{{!}}"),
+]
+
+# Same layout, but container and vehicle chances come from the exact loot probability engine
+EXACT_LOCATION_TABLE = [
+    Section("Containers", "container", [
+        Column("Room"),
+        Column("Container", link=True),
+        Column(exact_chance, suffix="%"),
+    ]),
+    Section("Vehicles", "vehicle", [
+        Column("Type"),
+        Column("Container", link=True),
+        Column(exact_chance, suffix="%"),
+    ]),
+] + LOCATION_TABLE[2:]
+
+
+def table_layout(chance_mode="formula", aggregate=None, top_rows=None):
+    """
+    Sections of the Location table for the given options.
+
+    :param chance_mode: "formula" or "exact", see `EXACT_LOCATION_TABLE`
+    :param aggregate: One of `AGGREGATE_MODES` to collapse the container and vehicle rows
+    :param top_rows: Keep this many container and vehicle rows plus a summary row; implies
+        aggregation by container when `aggregate` isn't given
+    """
+    sections = EXACT_LOCATION_TABLE if chance_mode == "exact" else LOCATION_TABLE
+    if not aggregate and not top_rows:
+        return sections
+    if aggregate and aggregate not in AGGREGATE_MODES:
+        raise ValueError(f"Unknown aggregation mode {aggregate!r}, expected one of {', '.join(AGGREGATE_MODES)}")
+
+    chance = exact_chance if chance_mode == "exact" else effective_chance
+    group_by = aggregate or "container"
+    return [
+        AggregatedSection("Containers", "container", "Room", chance, group_by, top_rows),
+        AggregatedSection("Vehicles", "vehicle", "Type", chance, group_by, top_rows),
+    ] + sections[2:]
+
+
+def render_table(item_id, item_data, sections=LOCATION_TABLE, memo=None, name=None):
+    """
+    Render the Location table wikitext of one item.
+
+    :param item_id: The item id written to `item_id=`
+    :param item_data: The item record from `all_items.json`
+    :param sections: Table layout to render, defaults to `LOCATION_TABLE`
+    :param memo: Optional `RenderMemo` shared between items
+    :param name: Optional display name written to `name=`, for translated wikis
+    :return: The complete table as a string
+    """
+    buffer = ["{{Location table|item_id=", item_id]
+    if name:
+        buffer += ["|name=", name.replace("|", "{{!}}")]
+
+    # Only sections that have values are written
+    for section in sections:
+        data = item_data.get(section.key)
+        if data:
+            if memo is None:
+                section.render(data, buffer)
+            else:
+                memo.render(section, data, buffer)
+
+    buffer.append("\n}}")
+    return "".join(buffer)
@@ -0,0 +1,182 @@
+from functools import lru_cache
+
+from item_names import normalize_name
+
+# Loot probability engine for containers and vehicles.
+#
+# `formula_chance` is the closed-form figure the Location tables have always shown: the chance of one
+# list entry succeeding at least once over the list's rolls, treating every room/container/proclist
+# row as independent.
+#
+# `ExactChanceCalculator` instead follows how a container is actually filled:
+#   - every container picks exactly one procedural list from its `procList`. Lists whose `min` has
+#     not been reached in the room yet are picked first, lists that reached their `max` (0 means no
+#     limit) are skipped, and the pick among the rest is weighted by `weightChance`. Entries without a
+#     weight get the average weight of the others, or all lists are equally likely if none has one.
+#     Picks are tracked over `containers_per_room` containers of the same type in a room, and the
+#     chance of a list is the average over those containers.
+#   - each roll of the picked list tests every entry of `items` separately, so an item listed twice
+#     gets two tries per roll. `junk` items are tested the same way over the junk rolls.
+# Item chances are memoized per procedural list and pick chances per `procList`, so the whole catalogue
+# is evaluated in one pass over the distributions.
+
+LOOT_MODIFIER = 0.6
+
+# The game doesn't say how many containers of one type a room holds, and the `min`/`max` limits of a
+# `procList` only matter when there are several. Four is an assumed typical count (a kitchen's counters,
+# a garage's shelves), not a figure read from the game files; `--containers-per-room` overrides it.
+# With 1 only the first pick of a room counts, so lists with a `min` are always picked.
+CONTAINERS_PER_ROOM = 4
+
+
+def roll_chance(chance, rolls):
+    """Chance of a single list entry succeeding on one roll, capped at 1 for very high chances."""
+    return min(1.0, (1 + ((100 * chance * LOOT_MODIFIER) + (10 * rolls))) / 10000)
+
+
+def formula_chance(chance, rolls):
+    """Closed-form chance in percent of one list entry succeeding at least once over `rolls`."""
+    return round((1 - (1 - roll_chance(chance, rolls)) ** rolls) * 100, 2)
+
+
+def list_item_chances(content):
+    """
+    Chance of every item appearing at least once when a list is rolled.
+
+    :param content: A procedural list (or vehicle distribution) with `rolls`, `items` and optional `junk`.
+        Items may be a list of `{"name", "chance"}` entries or a `{name: chance}` dict.
+    :return: Dictionary of item name, without its module, to probability (0-1)
+    """
+    miss_chances = {}
+
+    def add_entries(items, rolls):
+        if isinstance(items, dict):
+            items = [{"name": name, "chance": chance} for name, chance in items.items()]
+        for entry in items:
+            miss = (1 - roll_chance(entry["chance"], rolls)) ** rolls
+            name = normalize_name(entry["name"])
+            miss_chances[name] = miss_chances.get(name, 1.0) * miss
+
+    add_entries(content.get("items", []), content.get("rolls", 0))
+    junk = content.get("junk", {})
+    if junk:
+        add_entries(junk.get("items", []), junk.get("rolls", 0))
+
+    return {name: 1 - miss for name, miss in miss_chances.items()}
+
+
+def proc_list_signature(proc_list):
+    """Hashable description of a `procList`, used as the memo key for its pick chances."""
+    weights = [entry.get("weightChance") for entry in proc_list]
+    given = [weight for weight in weights if weight is not None]
+    default_weight = sum(given) / len(given) if given else 1
+    return tuple(
+        (entry.get("name"), entry.get("min", 0) or 0, entry.get("max", 0) or 0,
+         default_weight if weight is None else weight)
+        for entry, weight in zip(proc_list, weights)
+    )
+
+
+@lru_cache(maxsize=None)
+def proc_list_pick_chances(signature, containers_per_room=CONTAINERS_PER_ROOM):
+    """
+    Chance of each entry of a `procList` being the list a container is filled from.
+
+    :param signature: Result of `proc_list_signature`
+    :param containers_per_room: Number of containers of this type filled one after another in a room
+    :return: Tuple with the pick chance of every entry, in `procList` order
+    """
+    entry_count = len(signature)
+
+    def pick_weights(counts):
+        forced = [i for i in range(entry_count) if counts[i] < signature[i][1]]
+        candidates = forced or [i for i in range(entry_count)
+                                if signature[i][2] == 0 or counts[i] < signature[i][2]]
+        if not candidates:
+            return {}
+        weights = {i: signature[i][3] for i in candidates}
+        total = sum(weights.values())
+        if total <= 0:
+            return {i: 1 / len(candidates) for i in candidates}
+        return {i: weight / total for i, weight in weights.items()}
+
+    @lru_cache(maxsize=None)
+    def expected_picks(counts, remaining):
+        # Expected number of times each entry is picked by the remaining containers of the room
+        expected = [0.0] * entry_count
+        if remaining == 0:
+            return tuple(expected)
+        for i, probability in pick_weights(counts).items():
+            next_counts = counts[:i] + (counts[i] + 1,) + counts[i + 1:]
+            expected[i] += probability
+            for j, picks in enumerate(expected_picks(next_counts, remaining - 1)):
+                expected[j] += probability * picks
+        return tuple(expected)
+
+    picks = expected_picks((0,) * entry_count, containers_per_room)
+    return tuple(count / containers_per_room for count in picks)
+
+
+class ExactChanceCalculator:
+    """
+    Computes exact container and vehicle chances from the parsed distributions.
+
+    Usage:
+        calculator = ExactChanceCalculator(procedural_data, distribution_data)
+        calculator.container_chance("Axe", "garage", "metal_shelves", "GarageTools")
+    """
+
+    def __init__(self, procedural_data, distribution_data, containers_per_room=CONTAINERS_PER_ROOM):
+        if containers_per_room < 1:
+            raise ValueError(f"containers_per_room must be at least 1, got {containers_per_room}")
+        self.procedural_data = procedural_data
+        self.distribution_data = distribution_data
+        self.containers_per_room = containers_per_room
+        self.list_chances = {}
+        self.pick_chances = {}
+        self.vehicle_chances = {}
+
+    def item_chances(self, proclist):
+        """Memoized item chances of one procedural list."""
+        chances = self.list_chances.get(proclist)
+        if chances is None:
+            chances = list_item_chances(self.procedural_data.get(proclist, {}))
+            self.list_chances[proclist] = chances
+        return chances
+
+    def proclist_pick_chances(self, room, container):
+        """Memoized chance of each procedural list being picked for a room's container."""
+        key = (room, container)
+        chances = self.pick_chances.get(key)
+        if chances is None:
+            proc_list = self.distribution_data.get(room, {}).get(container, {}).get("procList", [])
+            picks = proc_list_pick_chances(proc_list_signature(proc_list), self.containers_per_room)
+            chances = {}
+            for entry, pick in zip(proc_list, picks):
+                chances[entry.get("name")] = chances.get(entry.get("name"), 0) + pick
+            self.pick_chances[key] = chances
+        return chances
+
+    def container_chance(self, item_name, room, container, proclist):
+        """
+        Chance in percent of the item spawning in the container through one of its procedural lists.
+
+        :return: Pick chance of the list multiplied by the item's chance within that list
+        """
+        pick = self.proclist_pick_chances(room, container).get(proclist, 0)
+        return round(pick * self.item_chances(proclist).get(item_name, 0) * 100, 2)
+
+    def add_vehicle(self, label, details):
+        """Memoize the item chances of a vehicle distribution, so `vehicle_chance` needs only its label."""
+        if label not in self.vehicle_chances:
+            self.vehicle_chances[label] = list_item_chances(details)
+
+    def vehicle_chance(self, item_name, label, details=None):
+        """
+        Chance in percent of the item spawning in a vehicle container, including its junk rolls.
+
+        :param details: The vehicle distribution, unless it was given to `add_vehicle` before
+        """
+        if details is not None:
+            self.add_vehicle(label, details)
+        return round(self.vehicle_chances[label].get(item_name, 0) * 100, 2)
@@ -0,0 +1,325 @@
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from intermediate_format import load_intermediate
+from item_index import split_vehicle_label
+from item_names import normalize_name
+from loot_probability import (CONTAINERS_PER_ROOM, LOOT_MODIFIER, ExactChanceCalculator, formula_chance,
+                              proc_list_signature)
+
+# Monte Carlo check of the container and vehicle chances shown in the Location tables.
+#
+# Every room/container with a `procList` is filled `trials` times the way the game does it:
+#   - a room holds `containers_per_room` containers of that type, filled one after another. Each
+#     picks one procedural list: lists below their `min` first, lists at their `max` skipped, the
+#     rest drawn by `weightChance`.
+#   - the picked list is rolled `rolls` times, each roll testing every `items` entry with an integer
+#     draw below 10000 against the entry's threshold, like the game, and the junk entries over the
+#     junk rolls.
+# Vehicle distributions are filled the same way, without the list pick.
+#
+# Nothing is taken from the probabilities of `loot_probability`, so each placement is checked twice:
+# the chance of each list entry within the picked list against `formula_chance`, the figure of the
+# tables, and the item's chance per container fill against `ExactChanceCalculator`. Rooms/containers
+# are spread over worker processes, and draws are made in NumPy batches.
+#
+# Requires NumPy, which is only imported when a simulation runs.
+
+Z_95 = 1.959964
+DEFAULT_TRIALS = 100_000
+DEFAULT_BATCH_SIZE = 10_000
+ROLL_RANGE = 10000
+
+
+def roll_threshold(chance, rolls):
+    """Threshold the game's integer draw below `ROLL_RANGE` must not exceed for an entry to spawn."""
+    return 100 * chance * LOOT_MODIFIER + 10 * rolls
+
+
+def wilson_interval(successes, trials, z=Z_95):
+    """95% Wilson score interval of a simulated probability, as (low, high)."""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def list_entries(items):
+    """Normalize a list's items to `(name, chance)` pairs; vehicle items are a `{name: chance}` dict."""
+    if isinstance(items, dict):
+        return [(normalize_name(name), chance) for name, chance in items.items()]
+    return [(normalize_name(entry["name"]), entry["chance"]) for entry in items]
+
+
+def list_job(content):
+    """Rolls and entries of one procedural list or vehicle distribution; missing lists are empty."""
+    junk = content.get("junk") or {}
+    return {
+        "rolls": content.get("rolls", 0),
+        "items": list_entries(content.get("items", [])),
+        "junk_rolls": junk.get("rolls", 0),
+        "junk_items": list_entries(junk.get("items", [])),
+    }
+
+
+def build_jobs(procedural_data, distribution_data, vehicle_data, containers_per_room=CONTAINERS_PER_ROOM):
+    """One simulation job per room/container with a `procList` and per vehicle distribution."""
+    jobs = []
+    for room, room_content in distribution_data.items():
+        for container, container_content in room_content.items():
+            proc_list = container_content.get("procList", []) if isinstance(container_content, dict) else []
+            if not proc_list:
+                continue
+            names = list(dict.fromkeys(entry.get("name") for entry in proc_list))
+            jobs.append({
+                "source": "container",
+                "room": room,
+                "container": container,
+                "containers": containers_per_room,
+                "picks": proc_list_signature(proc_list),
+                "lists": {name: list_job(procedural_data.get(name, {})) for name in names},
+            })
+    for label, details in vehicle_data.items():
+        jobs.append({
+            "source": "vehicle",
+            "label": label,
+            "containers": 1,
+            "picks": None,
+            "lists": {label: list_job(details)},
+        })
+    return jobs
+
+
+def pick_lists(rng, counts, signature):
+    """
+    Procedural list picked by each simulated container, following the `procList` rules.
+
+    :param counts: (trials, entries) number of times each entry was already picked in the room
+    :param signature: Result of `loot_probability.proc_list_signature`
+    :return: Index of the picked entry per trial, or -1 when no entry may be picked
+    """
+    import numpy as np
+
+    mins = np.array([entry[1] for entry in signature])
+    maxs = np.array([entry[2] for entry in signature])
+    weights = np.array([entry[3] for entry in signature], dtype=float)
+
+    forced = counts < mins
+    allowed = (maxs == 0) | (counts < maxs)
+    candidates = np.where(forced.any(axis=1, keepdims=True), forced, allowed)
+    pick_weights = candidates * weights
+    # Candidates without any weight are equally likely
+    unweighted = pick_weights.sum(axis=1) <= 0
+    pick_weights[unweighted] = candidates[unweighted]
+
+    cumulative = pick_weights.cumsum(axis=1)
+    total = cumulative[:, -1]
+    draws = rng.random(len(counts)) * total
+    picked = (cumulative <= draws[:, None]).sum(axis=1)
+    picked[total <= 0] = -1
+    return picked
+
+
+def roll_list(rng, groups, item_count, fills):
+    """
+    Roll one list for `fills` containers.
+
+    :param groups: (entries key, thresholds, item columns, rolls) of the regular and the junk entries
+    :return: (spawned, entry_hits): (fills, items) whether each item spawned at least once, and per
+        entries key the number of fills in which each entry hit
+    """
+    import numpy as np
+
+    spawned = np.zeros((fills, item_count), dtype=bool)
+    entry_hits = {}
+    for key, thresholds, item_columns, rolls in groups:
+        # (fills, rolls, entries) draws; an entry hits if any of its rolls succeeds
+        draws = rng.integers(0, ROLL_RANGE, size=(fills, rolls, len(thresholds)), dtype=np.int16)
+        hits = (draws <= thresholds).any(axis=1)
+        entry_hits[key] = hits.sum(axis=0)
+        # Several entries can point at the same item, any of them spawning it is enough
+        for entry_index, column in enumerate(item_columns):
+            spawned[:, column] |= hits[:, entry_index]
+    return spawned, entry_hits
+
+
+def simulate_job(job, trials, seed, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Fill the containers of one job `trials` times.
+
+    :return: (fills, picks, successes, entry_successes): the number of containers filled, the number
+        of containers filled from each list, per list the number of containers in which each item
+        spawned, and per list and entries key ("items" or "junk_items") the number of containers in
+        which each entry hit
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    list_names = list(job["lists"])
+    rolled = {}
+    for name, content in job["lists"].items():
+        items = sorted({item for item, chance in content["items"]} | {item for item, chance in content["junk_items"]})
+        columns = {item: index for index, item in enumerate(items)}
+        groups = []
+        entry_successes = {}
+        for key, rolls in (("items", content["rolls"]), ("junk_items", content["junk_rolls"])):
+            entries = content[key]
+            entry_successes[key] = np.zeros(len(entries), dtype=np.int64)
+            if entries and rolls > 0:
+                thresholds = np.array([roll_threshold(chance, rolls) for item, chance in entries])
+                groups.append((key, thresholds, [columns[item] for item, chance in entries], rolls))
+        rolled[name] = (items, groups, np.zeros(len(items), dtype=np.int64), entry_successes)
+
+    signature = job["picks"]
+    # procList entry to its list, as a list may be named by several entries
+    entry_lists = [list_names.index(entry[0]) for entry in signature] if signature else [0]
+    picks = np.zeros(len(list_names), dtype=np.int64)
+
+    done = 0
+    while done < trials:
+        batch = min(batch_size, trials - done)
+        counts = np.zeros((batch, len(entry_lists)), dtype=np.int64)
+        for _ in range(job["containers"]):
+            picked = pick_lists(rng, counts, signature) if signature else np.zeros(batch, dtype=np.int64)
+            valid = picked >= 0
+            counts[np.nonzero(valid)[0], picked[valid]] += 1
+            list_indices = np.where(valid, np.array(entry_lists)[np.maximum(picked, 0)], -1)
+            for list_index, name in enumerate(list_names):
+                fills = int((list_indices == list_index).sum())
+                if not fills:
+                    continue
+                picks[list_index] += fills
+                items, groups, successes, entry_successes = rolled[name]
+                spawned, entry_hits = roll_list(rng, groups, len(items), fills)
+                successes += spawned.sum(axis=0)
+                for key, hits in entry_hits.items():
+                    entry_successes[key] += hits
+        done += batch
+
+    return (trials * job["containers"], {name: int(picks[index]) for index, name in enumerate(list_names)},
+            {name: {item: int(count) for item, count in zip(items, successes)}
+             for name, (items, groups, successes, entry_successes) in rolled.items()},
+            {name: {key: [int(count) for count in counts] for key, counts in entry_successes.items()}
+             for name, (items, groups, successes, entry_successes) in rolled.items()})
+
+
+def _simulate_job_args(args):
+    return simulate_job(*args)
+
+
+def simulate_catalogue(procedural_data, distribution_data, vehicle_data, trials=DEFAULT_TRIALS, workers=None,
+                       seed=None, batch_size=DEFAULT_BATCH_SIZE, containers_per_room=CONTAINERS_PER_ROOM):
+    """
+    Simulate every room/container and vehicle distribution and compare the results with the chances
+    of the Location tables.
+
+    :param trials: Number of rooms (or vehicle containers) filled per job
+    :param workers: Number of worker processes, defaults to the number of cores
+    :param seed: Seed for reproducible runs
+    :param containers_per_room: Containers of one type filled per room, see `loot_probability.CONTAINERS_PER_ROOM`
+    :return: Report dictionary with one row per placement and a summary
+    """
+    import numpy as np
+
+    jobs = build_jobs(procedural_data, distribution_data, vehicle_data, containers_per_room)
+    seeds = np.random.SeedSequence(seed).spawn(len(jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_simulate_job_args,
+                                    [(job, trials, job_seed, batch_size) for job, job_seed in zip(jobs, seeds)],
+                                    chunksize=16))
+
+    calculator = ExactChanceCalculator(procedural_data, distribution_data, containers_per_room)
+    rows = []
+    for job, (fills, picks, successes, entry_successes) in zip(jobs, results):
+        for list_name, content in job["lists"].items():
+            if job["source"] == "container":
+                placement = {"Room": job["room"], "Container": job["container"], "Proclist": list_name}
+            else:
+                vehicle_type, container = split_vehicle_label(job["label"])
+                placement = {"Vehicle": job["label"], "Type": vehicle_type, "Container": container}
+            list_fills = picks[list_name]
+
+            for key, rolls, junk in (("items", content["rolls"], False), ("junk_items", content["junk_rolls"], True)):
+                for entry_index, (item_name, chance) in enumerate(content[key]):
+                    if job["source"] == "container":
+                        exact = calculator.container_chance(item_name, job["room"], job["container"], list_name)
+                    else:
+                        exact = calculator.vehicle_chance(item_name, job["label"], vehicle_data[job["label"]])
+                    # The formula is per entry, the exact chance per item over all of its entries
+                    entry_count = entry_successes[list_name][key][entry_index]
+                    count = successes[list_name][item_name]
+                    formula = formula_chance(chance, rolls)
+                    in_list_low, in_list_high = wilson_interval(entry_count, list_fills)
+                    low, high = wilson_interval(count, fills)
+                    rows.append(dict(placement, **{
+                        "Item": item_name,
+                        "Junk": junk,
+                        # Containers filled from this list
+                        "Picked": round(list_fills / fills * 100, 4),
+                        # Chance of this entry once this list fills the container, the figure of the tables
+                        "Formula": formula,
+                        "SimulatedInList": round(entry_count / list_fills * 100, 4) if list_fills else None,
+                        "InListLow": round(in_list_low * 100, 4),
+                        "InListHigh": round(in_list_high * 100, 4),
+                        "FormulaWithinInterval": in_list_low * 100 <= formula <= in_list_high * 100,
+                        # Chance of the item per container filled
+                        "ExactChance": exact,
+                        "Simulated": round(count / fills * 100, 4),
+                        "Low": round(low * 100, 4),
+                        "High": round(high * 100, 4),
+                        "ExactWithinInterval": low * 100 <= exact <= high * 100,
+                    }))
+
+    return {
+        "summary": {
+            "trials": trials,
+            "containers_per_room": containers_per_room,
+            "jobs": len(jobs),
+            "placements": len(rows),
+            "formula_outside_interval": sum(not row["FormulaWithinInterval"] for row in rows),
+            "exact_outside_interval": sum(not row["ExactWithinInterval"] for row in rows),
+        },
+        "placements": rows,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate container and vehicle chances with a Monte Carlo simulation.")
+    parser.add_argument("--json-dir", default="output/distributions/json", help="Folder with the parsed intermediates")
+    parser.add_argument("-o", "--output", default="output/distributions/simulation.json", help="Report path")
+    parser.add_argument("--trials", type=int, default=DEFAULT_TRIALS,
+                        help="Rooms, or vehicle containers, filled per room/container and vehicle distribution")
+    parser.add_argument("--workers", type=int, help="Worker processes, defaults to the number of cores")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Trials drawn per NumPy batch")
+    parser.add_argument("--containers-per-room", type=int, default=CONTAINERS_PER_ROOM, metavar="N",
+                        help=f"Containers of one type filled per room (default {CONTAINERS_PER_ROOM})")
+    args = parser.parse_args(argv)
+
+    report = simulate_catalogue(
+        load_intermediate(os.path.join(args.json_dir, "proceduraldistributions.json")),
+        load_intermediate(os.path.join(args.json_dir, "distributions.json")),
+        load_intermediate(os.path.join(args.json_dir, "vehicle_distributions.json")),
+        trials=args.trials, workers=args.workers, seed=args.seed, batch_size=args.batch_size,
+        containers_per_room=args.containers_per_room,
+    )
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as report_file:
+        json.dump(report, report_file, indent=4)
+
+    summary = report["summary"]
+    print(f"Simulated {summary['jobs']} containers and vehicle distributions with {summary['trials']} trials each")
+    print(f"{summary['formula_outside_interval']} of {summary['placements']} placements have a formula chance "
+          f"outside the simulated 95% interval, {summary['exact_outside_interval']} an exact chance")
+    print("Simulation report has been written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
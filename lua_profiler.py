@@ -0,0 +1,126 @@
+import time
+from contextlib import contextmanager
+
+# Optional instrumentation for the lupa-based parsers in `distribution_parser`.
+#
+# A `LuaProfiler` times game Lua execution separately from the conversion of the resulting tables to
+# Python, counts the tables and entries read across the Python/Lua boundary, and can sample the Lua
+# functions that are running with a `debug.sethook` count hook. The parsers take a `profiler`
+# argument and use `NULL_PROFILER`, which does nothing, when profiling is off. `report()` is stored
+# with the stage in the pipeline checkpoint file.
+
+# Installs a count hook that tallies the running function every `interval` VM instructions. The
+# tallies stay in a Lua table until the chunk has finished, so sampling adds no boundary crossings.
+SAMPLING_HOOK = """
+__profile_samples = __profile_samples or {}
+local samples = __profile_samples
+debug.sethook(function()
+    local info = debug.getinfo(2, "Sn")
+    if info then
+        local key = info.short_src .. ":" .. tostring(info.linedefined) .. " " .. (info.name or info.what)
+        samples[key] = (samples[key] or 0) + 1
+    end
+end, "", %d)
+"""
+
+
+class NullProfiler:
+    """Profiler interface that does nothing; used when profiling is off."""
+
+    def execute(self, lua, lua_code, label=None):
+        lua.execute(lua_code)
+
+    @contextmanager
+    def converting(self):
+        yield
+
+    def table(self, entries):
+        pass
+
+    def report(self):
+        return None
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class LuaProfiler(NullProfiler):
+    """
+    Collects Lua execution and conversion statistics for one parser.
+
+    :param sample_interval: When set, sample the running Lua function every this many VM instructions
+    :param top: Number of hottest sampled functions kept in the report
+    """
+
+    def __init__(self, sample_interval=None, top=20):
+        self.sample_interval = sample_interval
+        self.top = top
+        self.executions = []
+        self.convert_seconds = 0.0
+        self.tables = 0
+        self.entries = 0
+        self.largest_table = 0
+        self.crossings = 0
+        self.samples = {}
+
+    def execute(self, lua, lua_code, label=None):
+        """Run `lua_code` in `lua`, timing it and sampling it if enabled."""
+        if self.sample_interval:
+            lua.execute(SAMPLING_HOOK % self.sample_interval)
+
+        started = time.perf_counter()
+        try:
+            # Named after the file so the samples show where the hot functions are defined
+            lua.execute(lua_code, name=f"@{label}" if label else None)
+        finally:
+            elapsed = time.perf_counter() - started
+            if self.sample_interval:
+                lua.execute("debug.sethook()")
+                self._collect_samples(lua)
+
+        self.executions.append({"label": label, "seconds": round(elapsed, 6), "bytes": len(lua_code)})
+        self.crossings += 1
+
+    def _collect_samples(self, lua):
+        samples = lua.globals()["__profile_samples"]
+        if samples is None:
+            return
+        for key, count in samples.items():
+            self.samples[key] = self.samples.get(key, 0) + count
+        lua.execute("__profile_samples = {}")
+
+    @contextmanager
+    def converting(self):
+        """Time the conversion of Lua tables to Python."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.convert_seconds += time.perf_counter() - started
+
+    def table(self, entries):
+        """
+        Record a Lua table read from Python.
+
+        The parsers only report the size of each table, so the crossings are estimated as one to iterate
+        it plus one per entry read. `lupa.lua_type` checks and separate `table[key]` lookups aren't
+        counted, which makes the figure a lower bound.
+        """
+        self.tables += 1
+        self.entries += entries
+        self.largest_table = max(self.largest_table, entries)
+        self.crossings += entries + 1
+
+    def report(self):
+        execute_seconds = sum(execution["seconds"] for execution in self.executions)
+        hottest = sorted(self.samples.items(), key=lambda sample: sample[1], reverse=True)[:self.top]
+        return {
+            "execute_seconds": round(execute_seconds, 6),
+            "convert_seconds": round(self.convert_seconds, 6),
+            "executions": self.executions,
+            "tables": self.tables,
+            "entries": self.entries,
+            "largest_table": self.largest_table,
+            "estimated_boundary_crossings": self.crossings,
+            "samples": dict(hottest),
+        }
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+
+import distribution_parser
+from item_names import normalize_name
+from resource_manifest import resource_files
+
+# Base game plus an ordered list of mods.
+#
+# A mod layer is a folder holding any of the files below, either directly or in a `lua/` subfolder.
+# Lua files are executed after the base game's file (and the layers before them) in the same Lua
+# state, so they can patch existing tables with `table.insert(ProceduralDistributions.list...)` or
+# add new definitions. `VehicleDistributions.lua` is parsed on its own and laid over the base
+# distributions label by label.
+#
+# The parsers report which items each layer changed. Those sets are saved in `MANIFEST_PATH`, so when
+# a mod is added, removed, reordered or updated only the items touched by the layers from that point
+# on need their records rebuilt and their tables rendered again.
+
+LAYER_FILES = [
+    "Distributions.lua",
+    "ProceduralDistributions.lua",
+    "VehicleDistributions.lua",
+    "forageDefinitions.lua",
+    "AttachedWeaponDefinitions.lua",
+]
+
+# Every base game resource read by `parse_layers` and the build after it; a change to any of them
+# rebuilds everything
+BASE_FILES = [
+    distribution_parser.DISTRIBUTIONS_LUA_PATH,
+    distribution_parser.PROCEDURAL_DISTRIBUTIONS_PATH,
+    distribution_parser.VEHICLE_DISTRIBUTIONS_PATH,
+    distribution_parser.FORAGE_DEFINITIONS_PATH,
+    distribution_parser.ATTACHED_WEAPON_PATH,
+    distribution_parser.CLOTHING_FILE_PATH,
+    distribution_parser.GUID_TABLE_PATH,
+    distribution_parser.CLASS_FILES_DIRECTORY,
+    # Item name changes applied by `Main.process_json`
+    "resources/itemname_en.txt",
+]
+
+MANIFEST_PATH = os.path.join(distribution_parser.JSON_OUTPUT_PATH, "layers.json")
+
+
+def find_layer_file(layer_path, file_name):
+    """Path of `file_name` in a mod layer, or None if the layer doesn't change that file."""
+    for candidate in (os.path.join(layer_path, file_name), os.path.join(layer_path, "lua", file_name)):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def files_signature(paths):
+    """Hash of the contents of the given files and folders; missing files count as empty."""
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(path.encode("utf-8") + b"\0")
+        for file_path in resource_files([path]) if path else ():
+            if file_path != path:
+                digest.update(os.path.relpath(file_path, path).encode("utf-8") + b"\0")
+            with open(file_path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def layer_signature(layer_path):
+    return files_signature([find_layer_file(layer_path, file_name) or "" for file_name in LAYER_FILES])
+
+
+def list_item_names(content):
+    """Item names of a procedural or non-procedural list, including junk."""
+    names = {entry["name"] for entry in content.get("items", [])}
+    names.update(entry["name"] for entry in content.get("junk", {}).get("items", []))
+    return names
+
+
+def container_touched_items(old_rooms, old_lists, new_rooms, new_lists):
+    """
+    Items whose container placements can differ between two parses of the container files.
+
+    Every item of a changed list is included, as is every item of the lists used by a changed room
+    container, before and after the change.
+    """
+    changed_lists = {name for name in old_lists.keys() | new_lists.keys() if old_lists.get(name) != new_lists.get(name)}
+
+    for room in old_rooms.keys() | new_rooms.keys():
+        old_room = old_rooms.get(room, {})
+        new_room = new_rooms.get(room, {})
+        for container in old_room.keys() | new_room.keys():
+            if old_room.get(container) != new_room.get(container):
+                for room_data in (old_room, new_room):
+                    for proc_entry in room_data.get(container, {}).get("procList", []):
+                        changed_lists.add(proc_entry.get("name"))
+
+    items = set()
+    for name in changed_lists:
+        for lists in (old_lists, new_lists):
+            items.update(list_item_names(lists.get(name, {})))
+    return {normalize_name(item) for item in items}
+
+
+def vehicle_touched_items(base_distributions, layer_distributions):
+    """Items of every vehicle label a layer adds or replaces with different content."""
+    items = set()
+    for label, details in layer_distributions.items():
+        old_details = base_distributions.get(label)
+        if old_details == details:
+            continue
+        for content in (old_details or {}, details):
+            items.update(content.get("items", {}))
+            items.update(content.get("junk", {}).get("items", {}))
+    return {normalize_name(item) for item in items}
+
+
+def foraging_touched_items(old_definitions, new_definitions):
+    items = set()
+    for key in old_definitions.keys() | new_definitions.keys():
+        if old_definitions.get(key) != new_definitions.get(key):
+            for definitions in (old_definitions, new_definitions):
+                if key in definitions:
+                    items.add(normalize_name(definitions[key].get("type") or key))
+    return items
+
+
+def attached_weapons_touched_items(old_definitions, new_definitions):
+    items = set()
+    for key in old_definitions.keys() | new_definitions.keys():
+        if old_definitions.get(key) != new_definitions.get(key):
+            for definitions in (old_definitions, new_definitions):
+                items.update(definitions.get(key, {}).get("weapons", []))
+    return {normalize_name(item) for item in items}
+
+
+def parse_layers(layer_paths, output_path=distribution_parser.JSON_OUTPUT_PATH):
+    """
+    Parse the base game resources with the given mod layers applied in order.
+
+    Clothing and stories aren't layered and come from the base game only.
+
+    :return: Manifest dictionary with the signature of the base game and, per layer, its signature
+        and the items it touched
+    """
+    layer_paths = list(layer_paths)
+    for layer_path in layer_paths:
+        if not os.path.isdir(layer_path):
+            raise FileNotFoundError(f"Mod layer {layer_path} does not exist")
+
+    touched_by_source = [
+        distribution_parser.parse_container_files(distribution_parser.DISTRIBUTIONS_LUA_PATH,
+                                                  distribution_parser.PROCEDURAL_DISTRIBUTIONS_PATH,
+                                                  output_path, layer_paths),
+        distribution_parser.parse_foraging(distribution_parser.FORAGE_DEFINITIONS_PATH, output_path, layer_paths),
+        distribution_parser.parse_vehicles(distribution_parser.VEHICLE_DISTRIBUTIONS_PATH, output_path, layer_paths),
+        distribution_parser.parse_attachedweapons(distribution_parser.ATTACHED_WEAPON_PATH, output_path, layer_paths),
+    ]
+    distribution_parser.parse_clothing(distribution_parser.CLOTHING_FILE_PATH, distribution_parser.GUID_TABLE_PATH,
+                                       os.path.join(output_path, "clothing.json"))
+    distribution_parser.parse_stories(distribution_parser.CLASS_FILES_DIRECTORY,
+                                      os.path.join(output_path, "stories.json"))
+
+    layers = []
+    for layer_path in layer_paths:
+        items = set()
+        for touched in touched_by_source:
+            items.update((touched or {}).get(layer_path, ()))
+        layers.append({
+            "name": os.path.basename(os.path.normpath(layer_path)),
+            "path": layer_path,
+            "signature": layer_signature(layer_path),
+            "items": sorted(items),
+        })
+        print(f"Layer {layer_path}: {len(items)} items touched")
+
+    return {"base": files_signature(BASE_FILES), "layers": layers}
+
+
+def affected_items(previous, current):
+    """
+    Items whose records and tables need rebuilding after the layer list changed.
+
+    Layers are compared in order; from the first layer that was added, removed, moved or changed,
+    every layer after it is reapplied on a different state, so the items touched by all of them,
+    in both manifests, are affected.
+
+    :return: Set of item names, or None when everything has to be rebuilt (no previous manifest, or
+        the base game changed)
+    """
+    if not previous or previous.get("base") != current.get("base"):
+        return None
+
+    def key(layer):
+        return layer["path"], layer["signature"]
+
+    old_layers = previous.get("layers", [])
+    new_layers = current.get("layers", [])
+    first_change = 0
+    while (first_change < len(old_layers) and first_change < len(new_layers)
+           and key(old_layers[first_change]) == key(new_layers[first_change])):
+        first_change += 1
+
+    items = set()
+    for layer in old_layers[first_change:] + new_layers[first_change:]:
+        items.update(layer["items"])
+    return items
+
+
+def load_manifest(manifest_path=MANIFEST_PATH):
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(manifest, manifest_path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
@@ -0,0 +1,355 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import distribution_parser
+from loot_probability import CONTAINERS_PER_ROOM
+
+# Dependency-tracked scheduler for the whole pipeline.
+#
+# Every stage declares the files it reads and writes. A stage depends on the stages writing its
+# inputs, so the six parsers run concurrently while later stages wait for what they need. After a
+# stage finishes, the size and modification time of its inputs and outputs are checkpointed in
+# `STATE_PATH`. On the next run a stage is skipped when its inputs, options and outputs still match
+# its checkpoint, so an interrupted run resumes after the last completed stage.
+
+STATE_PATH = "output/distributions/pipeline_state.json"
+
+JSON_DIR = distribution_parser.JSON_OUTPUT_PATH
+ITEM_LIST_PATH = "output/distributions/Item_list.txt"
+ITEM_NAME_CHANGES_PATH = os.path.join(JSON_DIR, "item_name_changes.json")
+ALL_ITEMS_PATH = os.path.join(JSON_DIR, "all_items.json")
+TABLES_DIR = "output/distributions/complete"
+ITEMNAME_PATH = "resources/ItemName_EN.txt"
+ITEMNAME_DICTIONARY_PATH = "resources/itemname_en.txt"
+MISSING_ITEMS_PATH = "output/distributions/missing_items.txt"
+
+PARSED_FILES = [os.path.join(JSON_DIR, file_name) for file_name in (
+    "proceduraldistributions.json", "distributions.json", "vehicle_distributions.json", "foraging.json",
+    "attached_weapons.json", "clothing.json", "stories.json",
+)]
+
+
+class Stage:
+    """
+    One step of the pipeline.
+
+    :param name: Stage name, used in the checkpoint file
+    :param function: Module-level function running the stage; it receives the pipeline options and may
+        return a dictionary that is stored with the stage's checkpoint as its report
+    :param inputs: Files or folders the stage reads
+    :param outputs: Files or folders the stage writes
+    :param options: Names of the pipeline options that change the stage's output
+    """
+
+    def __init__(self, name, function, inputs, outputs, options=()):
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.outputs = outputs
+        self.options = options
+
+
+def _convert_outputs(paths, options):
+    if options.get("binary_intermediates"):
+        from intermediate_format import convert
+
+        for path in paths:
+            if path.endswith(".json"):
+                convert(path)
+
+
+def _lua_profiler(options):
+    """A `LuaProfiler` when the "profile_lua" option is set, otherwise None."""
+    if not options.get("profile_lua"):
+        return None
+    from lua_profiler import LuaProfiler
+
+    return LuaProfiler(sample_interval=options.get("lua_sample_interval"))
+
+
+def _profile_report(profiler):
+    return {"lua_profile": profiler.report()} if profiler else None
+
+
+def parse_containers(options):
+    profiler = _lua_profiler(options)
+    distribution_parser.parse_container_files(distribution_parser.DISTRIBUTIONS_LUA_PATH,
+                                              distribution_parser.PROCEDURAL_DISTRIBUTIONS_PATH, JSON_DIR,
+                                              profiler=profiler)
+    _convert_outputs(STAGES_BY_NAME["parse_containers"].outputs, options)
+    return _profile_report(profiler)
+
+
+def parse_foraging(options):
+    profiler = _lua_profiler(options)
+    distribution_parser.parse_foraging(distribution_parser.FORAGE_DEFINITIONS_PATH, JSON_DIR, profiler=profiler)
+    _convert_outputs(STAGES_BY_NAME["parse_foraging"].outputs, options)
+    return _profile_report(profiler)
+
+
+def parse_vehicles(options):
+    distribution_parser.parse_vehicles(distribution_parser.VEHICLE_DISTRIBUTIONS_PATH, JSON_DIR)
+    _convert_outputs(STAGES_BY_NAME["parse_vehicles"].outputs, options)
+
+
+def parse_attachedweapons(options):
+    profiler = _lua_profiler(options)
+    distribution_parser.parse_attachedweapons(distribution_parser.ATTACHED_WEAPON_PATH, JSON_DIR, profiler=profiler)
+    _convert_outputs(STAGES_BY_NAME["parse_attachedweapons"].outputs, options)
+    return _profile_report(profiler)
+
+
+def parse_clothing(options):
+    distribution_parser.parse_clothing(distribution_parser.CLOTHING_FILE_PATH, distribution_parser.GUID_TABLE_PATH,
+                                       os.path.join(JSON_DIR, "clothing.json"))
+    _convert_outputs(STAGES_BY_NAME["parse_clothing"].outputs, options)
+
+
+def parse_stories(options):
+    distribution_parser.parse_stories(distribution_parser.CLASS_FILES_DIRECTORY, os.path.join(JSON_DIR, "stories.json"))
+    _convert_outputs(STAGES_BY_NAME["parse_stories"].outputs, options)
+
+
+def process_json(options):
+    import Main
+
+    Main.process_json(Main.FILE_PATHS)
+
+
+def build_item_json(options):
+    import Main
+
+    Main.run_build(item_list=Main.load_item_list(), binary_intermediates=options.get("binary_intermediates"),
+                   exact_chances=options.get("exact_chances"), workers=options.get("workers"),
+                   memory_budget=options.get("memory_budget"),
+                   containers_per_room=options.get("containers_per_room", CONTAINERS_PER_ROOM))
+
+
+def build_tables(options):
+    import Main
+
+    Main.build_tables(ALL_ITEMS_PATH, chance_mode=options.get("chance_mode", "formula"),
+                      aggregate=options.get("aggregate"), top_rows=options.get("top_rows"))
+
+
+def calculate_missing_items(options):
+    import Main
+
+    Main.run_missing()
+
+
+# Parsers taking a `LuaProfiler`; profiling must rerun them even when their output is current
+PROFILED_PARSE_OPTIONS = ["binary_intermediates", "profile_lua", "lua_sample_interval"]
+
+STAGES = [
+    Stage("parse_containers", parse_containers,
+          [distribution_parser.DISTRIBUTIONS_LUA_PATH, distribution_parser.PROCEDURAL_DISTRIBUTIONS_PATH],
+          [os.path.join(JSON_DIR, "distributions.json"), os.path.join(JSON_DIR, "proceduraldistributions.json")],
+          options=PROFILED_PARSE_OPTIONS),
+    Stage("parse_foraging", parse_foraging,
+          [distribution_parser.FORAGE_DEFINITIONS_PATH], [os.path.join(JSON_DIR, "foraging.json")],
+          options=PROFILED_PARSE_OPTIONS),
+    Stage("parse_vehicles", parse_vehicles,
+          [distribution_parser.VEHICLE_DISTRIBUTIONS_PATH], [os.path.join(JSON_DIR, "vehicle_distributions.json")],
+          options=["binary_intermediates"]),
+    Stage("parse_attachedweapons", parse_attachedweapons,
+          [distribution_parser.ATTACHED_WEAPON_PATH], [os.path.join(JSON_DIR, "attached_weapons.json")],
+          options=PROFILED_PARSE_OPTIONS),
+    Stage("parse_clothing", parse_clothing,
+          [distribution_parser.CLOTHING_FILE_PATH, distribution_parser.GUID_TABLE_PATH],
+          [os.path.join(JSON_DIR, "clothing.json")],
+          options=["binary_intermediates"]),
+    Stage("parse_stories", parse_stories,
+          [distribution_parser.CLASS_FILES_DIRECTORY], [os.path.join(JSON_DIR, "stories.json")],
+          options=["binary_intermediates"]),
+    Stage("process_json", process_json,
+          PARSED_FILES + [ITEMNAME_DICTIONARY_PATH], [ITEM_LIST_PATH, ITEM_NAME_CHANGES_PATH]),
+    Stage("build_item_json", build_item_json,
+          PARSED_FILES + [ITEM_LIST_PATH, ITEM_NAME_CHANGES_PATH], [ALL_ITEMS_PATH],
+          options=["binary_intermediates", "exact_chances", "containers_per_room"]),
+    Stage("build_tables", build_tables, [ALL_ITEMS_PATH], [TABLES_DIR],
+          options=["chance_mode", "aggregate", "top_rows"]),
+    Stage("calculate_missing_items", calculate_missing_items,
+          [ITEMNAME_PATH, ITEM_LIST_PATH], [MISSING_ITEMS_PATH]),
+]
+
+STAGES_BY_NAME = {stage.name: stage for stage in STAGES}
+
+
+def path_signature(path):
+    """Size and modification time of a file, or of every file in a folder; None if it doesn't exist."""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+    if os.path.isdir(path):
+        listing = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                stat = os.stat(os.path.join(root, file_name))
+                listing.append([os.path.relpath(os.path.join(root, file_name), path), stat.st_size, stat.st_mtime_ns])
+        return listing
+    return None
+
+
+def stage_signature(stage, options):
+    return {
+        "inputs": {path: path_signature(path) for path in stage.inputs},
+        "options": {name: options.get(name) for name in stage.options},
+    }
+
+
+def load_state(state_path=STATE_PATH):
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, "r") as state_file:
+            return json.load(state_file)
+    except ValueError:
+        print(f"Ignoring unreadable checkpoint file {state_path}")
+        return {}
+
+
+def save_state(state, state_path=STATE_PATH):
+    # Write to a temporary file first so a crash never leaves a half-written checkpoint
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    temporary_path = state_path + ".tmp"
+    with open(temporary_path, "w") as state_file:
+        json.dump(state, state_file, indent=4)
+    os.replace(temporary_path, state_path)
+
+
+def is_up_to_date(stage, options, state):
+    checkpoint = state.get(stage.name)
+    if not checkpoint:
+        return False
+    if checkpoint.get("signature") != stage_signature(stage, options):
+        return False
+    # Outputs must still be the ones the stage wrote
+    return all(checkpoint.get("outputs", {}).get(path) == path_signature(path) and path_signature(path) is not None
+               for path in stage.outputs)
+
+
+def stage_dependencies(stages):
+    """Map each stage name to the names of the stages writing one of its inputs."""
+    writers = {}
+    for stage in stages:
+        for path in stage.outputs:
+            writers[path] = stage.name
+    return {
+        stage.name: {writers[path] for path in stage.inputs if path in writers and writers[path] != stage.name}
+        for stage in stages
+    }
+
+
+def select_stages(targets, stages=STAGES):
+    """The target stages and every stage they depend on, in pipeline order."""
+    if not targets:
+        return list(stages)
+    dependencies = stage_dependencies(stages)
+    unknown = [target for target in targets if target not in dependencies]
+    if unknown:
+        raise ValueError(f"Unknown stages: {', '.join(unknown)}")
+
+    selected = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name not in selected:
+            selected.add(name)
+            pending.extend(dependencies[name])
+    return [stage for stage in stages if stage.name in selected]
+
+
+def _run_stage(stage_name, options):
+    started = time.perf_counter()
+    report = STAGES_BY_NAME[stage_name].function(options)
+    return time.perf_counter() - started, report
+
+
+def run_pipeline(options=None, targets=None, force=False, jobs=None, state_path=STATE_PATH):
+    """
+    Run the pipeline stages, skipping the ones that are up to date.
+
+    :param options: Pipeline options (binary_intermediates, exact_chances, workers, chance_mode, memory_budget,
+        profile_lua, lua_sample_interval, aggregate, top_rows, containers_per_room)
+    :param targets: Stage names to run, with their dependencies; defaults to every stage
+    :param force: Rerun stages even when they are up to date
+    :param jobs: Number of stages run at once, defaults to the number of cores
+    :param state_path: Checkpoint file
+    :return: Dictionary of stage name to "skipped", "done" or "failed"
+    """
+    options = dict(options or {})
+    stages = select_stages(targets)
+    dependencies = stage_dependencies(stages)
+    state = {} if force else load_state(state_path)
+
+    # Missing resources stop the run before any parser is started. They are only checked and
+    # fingerprinted once a stage reading them has to run, so an up-to-date run doesn't hash them all
+    resources = [path for path in distribution_parser.RESOURCE_PATHS
+                 if any(path in stage.inputs for stage in stages)]
+    resources_checked = not resources
+
+    results = {}
+    running = {}
+    failed = []
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while True:
+            # Schedule every stage whose dependencies have finished
+            for stage in stages:
+                if stage.name in results or stage.name in running.values():
+                    continue
+                if failed or not all(results.get(name) in ("done", "skipped") for name in dependencies[stage.name]):
+                    continue
+                # A stage is only skipped if nothing it depends on was rerun
+                rerun_dependency = any(results[name] == "done" for name in dependencies[stage.name])
+                if not force and not rerun_dependency and is_up_to_date(stage, options, state):
+                    results[stage.name] = "skipped"
+                    print(f"[{stage.name}] up to date, skipped")
+                    continue
+                if not resources_checked and any(path in resources for path in stage.inputs):
+                    distribution_parser.init(*resources)
+                    resources_checked = True
+                signature = stage_signature(stage, options)
+                print(f"[{stage.name}] started")
+                future = executor.submit(_run_stage, stage.name, options)
+                future.signature = signature
+                running[future] = stage.name
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage_name = running.pop(future)
+                try:
+                    duration, report = future.result()
+                except Exception as e:
+                    results[stage_name] = "failed"
+                    failed.append(stage_name)
+                    print(f"[{stage_name}] failed: {e}")
+                    continue
+
+                results[stage_name] = "done"
+                stage = STAGES_BY_NAME[stage_name]
+                state[stage_name] = {
+                    "signature": future.signature,
+                    "outputs": {path: path_signature(path) for path in stage.outputs},
+                    "duration": round(duration, 3),
+                }
+                if report:
+                    state[stage_name]["report"] = report
+                save_state(state, state_path)
+                print(f"[{stage_name}] done in {duration:.1f}s")
+                lua_profile = (report or {}).get("lua_profile")
+                if lua_profile:
+                    print(f"[{stage_name}] Lua execute {lua_profile['execute_seconds']:.3f}s, "
+                          f"conversion {lua_profile['convert_seconds']:.3f}s, "
+                          f"at least {lua_profile['estimated_boundary_crossings']} boundary crossings (estimated)")
+
+    if failed:
+        raise RuntimeError(f"Pipeline stopped, failed stages: {', '.join(failed)}")
+    return results
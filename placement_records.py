@@ -0,0 +1,115 @@
+import sys
+
+# Compact record types used while building item data.
+#
+# `build_item_json` produces tens of thousands of placements, most of which repeat the same room,
+# container and proclist names. Slotted records with interned names keep that in memory cheaply;
+# they are only turned into the dictionaries found in `all_items.json` when written out.
+
+
+def intern_name(name):
+    """Intern a name so repeated room/container/outfit strings share one object."""
+    return sys.intern(name) if isinstance(name, str) else name
+
+
+class ContainerPlacement:
+    __slots__ = ("room", "container", "proclist", "chance", "rolls", "exact_chance")
+
+    def __init__(self, room, container, proclist, chance, rolls, exact_chance=None):
+        self.room = intern_name(room)
+        self.container = intern_name(container)
+        self.proclist = intern_name(proclist)
+        self.chance = chance
+        self.rolls = rolls
+        self.exact_chance = exact_chance
+
+    def to_json(self):
+        data = {
+            "Room": self.room,
+            "Container": self.container,
+            "Proclist": self.proclist,
+            "Chance": self.chance,
+            "Rolls": self.rolls
+        }
+        if self.exact_chance is not None:
+            data["ExactChance"] = self.exact_chance
+        return data
+
+
+class VehiclePlacement:
+    __slots__ = ("vehicle_type", "container", "chance", "rolls", "exact_chance")
+
+    def __init__(self, vehicle_type, container, chance, rolls, exact_chance=None):
+        self.vehicle_type = intern_name(vehicle_type)
+        self.container = intern_name(container)
+        self.chance = chance
+        self.rolls = rolls
+        self.exact_chance = exact_chance
+
+    def to_json(self):
+        data = {
+            "Type": self.vehicle_type,
+            "Container": self.container,
+            "Chance": self.chance,
+            "Rolls": self.rolls
+        }
+        if self.exact_chance is not None:
+            data["ExactChance"] = self.exact_chance
+        return data
+
+
+class AttachedWeaponPlacement:
+    __slots__ = ("outfit", "day_survived", "chance")
+
+    def __init__(self, outfit, day_survived, chance):
+        self.outfit = intern_name(outfit)
+        self.day_survived = day_survived
+        self.chance = chance
+
+    def to_json(self):
+        return {
+            "outfit": self.outfit,
+            "daySurvived": self.day_survived,
+            "chance": self.chance
+        }
+
+
+class OutfitPlacement:
+    __slots__ = ("guid", "outfit", "chance")
+
+    def __init__(self, guid, outfit, chance):
+        self.guid = intern_name(guid)
+        self.outfit = intern_name(outfit)
+        self.chance = chance
+
+    def to_json(self):
+        return {
+            "GUID": self.guid,
+            "Outfit": self.outfit,
+            "Chance": self.chance
+        }
+
+
+class ItemRecord:
+    __slots__ = ("name", "containers", "vehicles", "foraging", "attached_weapon", "clothing", "stories")
+
+    def __init__(self, name, containers, vehicles, foraging, attached_weapon, clothing, stories):
+        self.name = name
+        self.containers = containers
+        self.vehicles = vehicles
+        self.foraging = foraging
+        self.attached_weapon = attached_weapon
+        self.clothing = clothing
+        self.stories = stories
+
+    def to_json(self):
+        """Convert the record to the dictionary layout used by `all_items.json`."""
+        return {
+            "name": self.name,
+            "Containers": [placement.to_json() for placement in self.containers],
+            "Vehicles": [placement.to_json() for placement in self.vehicles],
+            "Foraging": self.foraging,
+            "AttachedWeapon": [placement.to_json() for placement in self.attached_weapon],
+            "Clothing": [placement.to_json() for placement in self.clothing],
+            "Stories": self.stories
+        }
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+
+import location_table
+import loot_probability
+
+# Persistent cache of which tables are already up to date on disk.
+#
+# `build_tables` hashes every item record as it is read and compares it with the hash stored for the
+# item by the previous run. When they match, and the table file is still there, the item is skipped
+# without being rendered or written, so after a small game patch rendering costs scale with the number
+# of changed items. The whole cache is dropped when the table layout changes: a different chance mode
+# or aggregation, a new `location_table.TEMPLATE_VERSION`, or any edit to the modules in
+# `RENDER_MODULES`.
+
+DEFAULT_CACHE_PATH = "output/distributions/render_cache.json"
+
+# Code a table is rendered with: the templates, and `formula_chance` for the chance column
+RENDER_MODULES = [location_table, loot_probability]
+
+
+def record_hash(record):
+    return location_table.RenderMemo.data_key(record).hex()
+
+
+def template_key(*layout_options):
+    """Identifies the table layout: template version, layout options and the code of `RENDER_MODULES`."""
+    source_hash = hashlib.blake2b(digest_size=8)
+    for module in RENDER_MODULES:
+        with open(module.__file__, "rb") as source_file:
+            source_hash.update(source_file.read())
+    return f"{location_table.TEMPLATE_VERSION}:{source_hash.hexdigest()}:{json.dumps(layout_options)}"
+
+
+class RenderCache:
+    """
+    Record hashes of the tables written by the previous run.
+
+    Usage:
+        cache = RenderCache(tables_dir, template_key("formula", None, None))
+        if not cache.is_current(item_id, digest):
+            ...render and write...
+        cache.update(item_id, digest)
+        cache.save()
+
+    :param tables_dir: Folder holding the `<item_id>.txt` tables
+    :param template: Result of `template_key`
+    :param path: Cache file; None keeps nothing between runs
+    :param reuse: False renders every table, ignoring the previous hashes, and still saves the new ones
+    """
+
+    def __init__(self, tables_dir, template, path=DEFAULT_CACHE_PATH, reuse=True):
+        self.tables_dir = tables_dir
+        self.template = template
+        self.path = path
+        self.previous = {}
+        self.hashes = {}
+        self.skipped = 0
+        self.rendered = 0
+        if reuse and path and os.path.exists(path):
+            try:
+                with open(path, "r") as cache_file:
+                    cache = json.load(cache_file)
+            except ValueError:
+                cache = {}
+            if cache.get("template") == template:
+                self.previous = cache.get("items", {})
+
+    def is_current(self, item_id, digest):
+        """Whether the table of `item_id` on disk was rendered from a record with this hash."""
+        current = (self.previous.get(item_id) == digest
+                   and os.path.exists(os.path.join(self.tables_dir, f"{item_id}.txt")))
+        if current:
+            self.skipped += 1
+        else:
+            self.rendered += 1
+        return current
+
+    def update(self, item_id, digest):
+        self.hashes[item_id] = digest
+
+    def keep(self, item_id):
+        """Carry over the entry of an item that wasn't looked at in this run."""
+        if item_id in self.previous:
+            self.hashes[item_id] = self.previous[item_id]
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as cache_file:
+            json.dump({"template": self.template, "items": self.hashes}, cache_file)
+        os.replace(temporary_path, self.path)
+
+    def summary(self):
+        return f"Render cache: {self.skipped} tables unchanged, {self.rendered} rendered"
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import re
+
+# Fingerprints of the game resources a run was parsed from.
+#
+# `build_manifest` records the size, modification time and SHA-256 of every resource file (folders
+# such as the Java class files are expanded), plus the game build when it can be found. Files are
+# hashed in 1 MB chunks on a thread pool; hashlib releases the GIL while hashing, so large Lua files
+# are read and hashed in parallel. A file whose size and modification time match the previous
+# manifest keeps its recorded hash and isn't read again.
+#
+# The manifest is written next to the parsed JSON, so the output of a run can be traced back to the
+# exact resources and compared with another run's.
+
+MANIFEST_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_THREADS = 8
+
+# Files that give the game version away, checked in order. `version.txt` can be dropped into the
+# resources folder by hand; the Steam app manifest carries the build id of the installed game.
+VERSION_FILE_NAME = "version.txt"
+STEAM_MANIFEST_NAME = "appmanifest_108600.acf"
+STEAM_BUILD_PATTERN = re.compile(r'"buildid"\s+"(\d+)"')
+VERSION_PATTERN = re.compile(r"\b(\d+\.\d+(?:\.\d+)?)\b")
+
+
+def resource_files(paths):
+    """Expand folders to the files they contain; paths that don't exist are left out."""
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+        elif os.path.isdir(path):
+            for root, dirs, file_names in os.walk(path):
+                dirs.sort()
+                files.extend(os.path.join(root, file_name) for file_name in sorted(file_names))
+    return files
+
+
+def missing_resources(paths):
+    return [path for path in paths if not os.path.exists(path)]
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_files(paths, previous=None, threads=DEFAULT_THREADS):
+    """
+    Size, modification time and content hash of every file.
+
+    :param previous: Entries of an earlier manifest; a file with the same size and modification time
+        reuses its hash
+    :return: Dictionary of path to `{"size", "mtime_ns", "sha256"}`
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    previous = previous or {}
+    entries = {}
+    to_hash = []
+    for path in paths:
+        stat = os.stat(path)
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        old_entry = previous.get(path, {})
+        if old_entry.get("size") == entry["size"] and old_entry.get("mtime_ns") == entry["mtime_ns"]:
+            entry["sha256"] = old_entry["sha256"]
+        else:
+            to_hash.append(path)
+        entries[path] = entry
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for path, digest in zip(to_hash, executor.map(hash_file, to_hash)):
+                entries[path]["sha256"] = digest
+    return entries
+
+
+def detect_game_build(resources_dir):
+    """
+    The game version or build the resources come from, if a file in `resources_dir` says so.
+
+    :return: `{"version" or "build": ..., "source": path}`, or None when it can't be told
+    """
+    version_path = os.path.join(resources_dir, VERSION_FILE_NAME)
+    if os.path.isfile(version_path):
+        with open(version_path, "r", encoding="utf-8", errors="replace") as version_file:
+            match = VERSION_PATTERN.search(version_file.read())
+        if match:
+            return {"version": match.group(1), "source": version_path}
+
+    steam_path = os.path.join(resources_dir, STEAM_MANIFEST_NAME)
+    if os.path.isfile(steam_path):
+        with open(steam_path, "r", encoding="utf-8", errors="replace") as steam_file:
+            match = STEAM_BUILD_PATTERN.search(steam_file.read())
+        if match:
+            return {"build": match.group(1), "source": steam_path}
+    return None
+
+
+def build_manifest(paths, resources_dir="resources", previous=None, threads=DEFAULT_THREADS):
+    """
+    Fingerprint the resources a run reads.
+
+    :param paths: Resource files and folders
+    :param previous: Earlier manifest whose hashes are reused for unchanged files
+    :raises FileNotFoundError: If any of the resources is missing
+    """
+    missing = missing_resources(paths)
+    if missing:
+        raise FileNotFoundError(f"Resources missing: {', '.join(missing)}")
+
+    previous_files = (previous or {}).get("files") if (previous or {}).get("version") == MANIFEST_VERSION else None
+    return {
+        "version": MANIFEST_VERSION,
+        "game_build": detect_game_build(resources_dir),
+        "files": fingerprint_files(resource_files(paths), previous_files, threads),
+    }
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+    except ValueError:
+        return None
+
+
+def save_manifest(manifest, manifest_path):
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=4)
@@ -0,0 +1,205 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+import zlib
+
+from intermediate_format import BINARY_EXTENSION, encode_binary, decode_binary, save_intermediate
+from item_store import load_items
+
+# Content-addressed store of the parsed intermediates of many game builds.
+#
+# `save` takes the parser intermediates of `output/distributions/json/` (the parsed sources, `all_items`
+# and the name changes, see `SOURCE_NAMES`) and stores each one as an object named after the hash of its content. An
+# intermediate that didn't change between two builds is the same object, so it is only stored once.
+# Objects hold the `.pzbin` form of the data compressed with zlib, so loading one back is a
+# decompression and an unpickle, without any JSON parsing. Each build is a small JSON file listing
+# the object of every source:
+#
+#   output/snapshots/builds/<build>.json
+#   output/snapshots/objects/<first two hash characters>/<hash>
+#
+# The hash is taken over the data in its stored key order, so an object always checks out exactly as
+# it was saved; the same data parsed in a different table order by Lua is a different object.
+
+DEFAULT_STORE_DIR = "output/snapshots"
+DEFAULT_SOURCE_DIR = "output/distributions/json"
+COMPRESSION_LEVEL = 6
+SOURCE_EXTENSIONS = (".json", ".jsonl", BINARY_EXTENSION)
+# Intermediates written by the parsers; bookkeeping such as the resources manifest or the mod layers isn't kept
+SOURCE_NAMES = ("proceduraldistributions", "distributions", "vehicle_distributions", "foraging", "attached_weapons",
+                "clothing", "stories", "all_items", "item_name_changes")
+
+
+def data_hash(data):
+    serialized = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def find_sources(source_dir):
+    """
+    Parser intermediates in `source_dir`, as source name to path.
+
+    When a source exists in several forms the `.json` file is taken, as every run writes it.
+    """
+    sources = {}
+    for file_name in sorted(os.listdir(source_dir)):
+        name, extension = os.path.splitext(file_name)
+        if (name in SOURCE_NAMES and extension in SOURCE_EXTENSIONS
+                and (name not in sources or extension == ".json")):
+            sources[name] = os.path.join(source_dir, file_name)
+    return sources
+
+
+class SnapshotStore:
+    """
+    Snapshots of the intermediates of game builds, deduplicated across builds.
+
+    Usage:
+        store = SnapshotStore()
+        store.save("41.78.16")
+        procedural_data = store.load("41.78.16", "proceduraldistributions")
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.builds_dir = os.path.join(root, "builds")
+        self.objects_dir = os.path.join(root, "objects")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def build_path(self, build):
+        return os.path.join(self.builds_dir, f"{build}.json")
+
+    def builds(self):
+        if not os.path.isdir(self.builds_dir):
+            return []
+        return sorted(os.path.splitext(file_name)[0] for file_name in os.listdir(self.builds_dir)
+                      if file_name.endswith(".json"))
+
+    def manifest(self, build):
+        path = self.build_path(build)
+        if not os.path.exists(path):
+            raise KeyError(f"No snapshot named {build!r} in {self.root}")
+        with open(path, "r") as manifest_file:
+            return json.load(manifest_file)
+
+    def save(self, build, source_dir=DEFAULT_SOURCE_DIR):
+        """
+        Store the intermediates of `source_dir` as the snapshot of `build`, replacing any older one.
+
+        :return: The snapshot manifest, with the number of objects added and reused under "stored"
+        """
+        sources = {}
+        added = reused = 0
+        for name, path in find_sources(source_dir).items():
+            data = load_items(path)
+            digest = data_hash(data)
+            object_path = self.object_path(digest)
+            if os.path.exists(object_path):
+                reused += 1
+            else:
+                payload = zlib.compress(encode_binary(data), COMPRESSION_LEVEL)
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                # Written under a temporary name so an interrupted save never leaves a truncated object
+                temporary_path = f"{object_path}.{os.getpid()}.tmp"
+                with open(temporary_path, "wb") as object_file:
+                    object_file.write(payload)
+                os.replace(temporary_path, object_path)
+                added += 1
+            sources[name] = {"hash": digest, "entries": len(data), "bytes": os.path.getsize(object_path)}
+
+        manifest = {
+            "build": build,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "source_dir": source_dir,
+            "sources": sources,
+            "stored": {"added": added, "reused": reused},
+        }
+        os.makedirs(self.builds_dir, exist_ok=True)
+        with open(self.build_path(build), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+        return manifest
+
+    def load(self, build, source):
+        """Load one source of a snapshot, e.g. `load("41.78.16", "all_items")`."""
+        sources = self.manifest(build)["sources"]
+        if source not in sources:
+            raise KeyError(f"Snapshot {build!r} has no source {source!r}")
+        digest = sources[source]["hash"]
+        with open(self.object_path(digest), "rb") as object_file:
+            return decode_binary(zlib.decompress(object_file.read()), f"object {digest}")
+
+    def changed_sources(self, old_build, new_build):
+        """Names of the sources whose content differs between two snapshots; found from the hashes alone."""
+        old_sources = self.manifest(old_build)["sources"]
+        new_sources = self.manifest(new_build)["sources"]
+        return sorted(name for name in old_sources.keys() | new_sources.keys()
+                      if old_sources.get(name, {}).get("hash") != new_sources.get(name, {}).get("hash"))
+
+    def checkout(self, build, output_dir):
+        """Write the sources of a snapshot back out as `.json` intermediates in `output_dir`."""
+        for source in self.manifest(build)["sources"]:
+            save_intermediate(self.load(build, source), os.path.join(output_dir, f"{source}.json"))
+
+    def remove(self, build):
+        """Delete a snapshot and the objects no other snapshot uses."""
+        removed = set(source["hash"] for source in self.manifest(build)["sources"].values())
+        os.remove(self.build_path(build))
+        for other in self.builds():
+            removed -= {source["hash"] for source in self.manifest(other)["sources"].values()}
+        for digest in removed:
+            if os.path.exists(self.object_path(digest)):
+                os.remove(self.object_path(digest))
+        return len(removed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep deduplicated snapshots of the intermediates of game builds.")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="Snapshot store folder")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    save_parser = subparsers.add_parser("save", help="Snapshot the current intermediates under a build name")
+    save_parser.add_argument("build", help="Name of the snapshot, e.g. the game version")
+    save_parser.add_argument("--from", dest="source_dir", default=DEFAULT_SOURCE_DIR,
+                             help="Folder with the intermediates")
+
+    subparsers.add_parser("list", help="List the snapshots")
+
+    checkout_parser = subparsers.add_parser("checkout", help="Write a snapshot back out as JSON intermediates")
+    checkout_parser.add_argument("build")
+    checkout_parser.add_argument("output_dir")
+
+    changed_parser = subparsers.add_parser("changed", help="List the sources that differ between two snapshots")
+    changed_parser.add_argument("old")
+    changed_parser.add_argument("new")
+
+    remove_parser = subparsers.add_parser("remove", help="Delete a snapshot and the objects only it uses")
+    remove_parser.add_argument("build")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.store)
+    if args.command == "save":
+        manifest = store.save(args.build, args.source_dir)
+        stored = manifest["stored"]
+        print(f"Saved {len(manifest['sources'])} sources as {args.build}: {stored['added']} new, "
+              f"{stored['reused']} already stored")
+    elif args.command == "list":
+        for build in store.builds():
+            manifest = store.manifest(build)
+            size = sum(source["bytes"] for source in manifest["sources"].values())
+            print(f"{build}  {manifest['created']}  {len(manifest['sources'])} sources, {size / 1024:.0f} KB")
+    elif args.command == "checkout":
+        store.checkout(args.build, args.output_dir)
+        print(f"Wrote {args.build} to {args.output_dir}")
+    elif args.command == "changed":
+        for name in store.changed_sources(args.old, args.new):
+            print(name)
+    elif args.command == "remove":
+        print(f"Removed {args.build} and {store.remove(args.build)} objects")
+
+
+if __name__ == "__main__":
+    main()
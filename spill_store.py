@@ -0,0 +1,155 @@
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+# On-disk storage for the lookup indexes of `item_index.ItemIndex`.
+#
+# Large modded catalogues can produce indexes that don't fit in the memory of a small CI runner. In
+# out-of-core mode each index is a `SpillMultimap`: entries are pickled and inserted into a scratch
+# SQLite database in batches while the index is built, and looked up by key afterwards, with a small
+# LRU cache in front for keys that are read repeatedly. `MemoryMultimap` has the same interface and
+# is used when everything fits. `should_spill` decides between the two from a memory budget.
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_CACHE_SIZE = 1024
+
+# Rough size in memory of parsed JSON compared to the file on disk
+MEMORY_EXPANSION = 6
+
+
+def estimate_memory(paths):
+    """Rough number of bytes needed to hold the given intermediates in memory."""
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path)) * MEMORY_EXPANSION
+
+
+def should_spill(paths, memory_budget):
+    """
+    Whether the indexes built from `paths` should be kept on disk.
+
+    :param memory_budget: Budget in megabytes; None or 0 always keeps everything in memory
+    """
+    if not memory_budget:
+        return False
+    return estimate_memory(paths) > memory_budget * 1024 * 1024
+
+
+class MemoryMultimap(dict):
+    """Dictionary of key to list of values, with the same `add`/`finish` interface as `SpillMultimap`."""
+
+    def add(self, key, value):
+        self.setdefault(key, []).append(value)
+
+    def finish(self):
+        pass
+
+
+class SpillStore:
+    """
+    Scratch SQLite database holding one table per `SpillMultimap`.
+
+    Usage:
+        with SpillStore() as store:
+            index = store.multimap("list_entries")
+    """
+
+    def __init__(self, directory=None):
+        handle, self.path = tempfile.mkstemp(prefix="pzdist_spill_", suffix=".sqlite", dir=directory)
+        os.close(handle)
+        self.maps = []
+
+    def multimap(self, name, batch_size=DEFAULT_BATCH_SIZE, cache_size=DEFAULT_CACHE_SIZE):
+        spill_map = SpillMultimap(self.path, name, batch_size, cache_size)
+        self.maps.append(spill_map)
+        return spill_map
+
+    def close(self):
+        for spill_map in self.maps:
+            spill_map.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SpillMultimap:
+    """
+    Key to list of values mapping stored in SQLite.
+
+    Values are kept in the order they were added. Each process opens its own connection, so a
+    finished map can be read from forked or spawned worker processes.
+    """
+
+    def __init__(self, path, name, batch_size=DEFAULT_BATCH_SIZE, cache_size=DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.table = f"spill_{name}"
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._pending = []
+        self._cache = OrderedDict()
+        self._connection = None
+        self._pid = None
+        self.connection().execute(f"CREATE TABLE {self.table} (key TEXT, value BLOB)")
+
+    def connection(self):
+        # SQLite connections can't be shared with a forked child, so every process opens its own
+        if self._connection is None or self._pid != os.getpid():
+            import sqlite3
+
+            self._connection = sqlite3.connect(self.path)
+            self._connection.execute("PRAGMA journal_mode=OFF")
+            self._connection.execute("PRAGMA synchronous=OFF")
+            self._pid = os.getpid()
+            self._cache = OrderedDict()
+        return self._connection
+
+    def add(self, key, value):
+        self._pending.append((key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            connection = self.connection()
+            connection.executemany(f"INSERT INTO {self.table} (key, value) VALUES (?, ?)", self._pending)
+            connection.commit()
+            self._pending = []
+
+    def finish(self):
+        """Write the remaining entries and index the keys; call once every value has been added."""
+        self._flush()
+        connection = self.connection()
+        connection.execute(f"CREATE INDEX {self.table}_key ON {self.table} (key)")
+        connection.commit()
+
+    def get(self, key, default=None):
+        cache = self._cache
+        if key in cache:
+            cache.move_to_end(key)
+            values = cache[key]
+        else:
+            rows = self.connection().execute(f"SELECT value FROM {self.table} WHERE key = ? ORDER BY rowid", (key,))
+            values = [pickle.loads(value) for value, in rows]
+            cache[key] = values
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return values if values else default
+
+    def keys(self):
+        """Distinct keys, in no particular order; call after `finish`."""
+        return {key for key, in self.connection().execute(f"SELECT DISTINCT key FROM {self.table}")}
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def __getstate__(self):
+        # Spawned workers receive the map without the parent's connection and cache
+        state = self.__dict__.copy()
+        state.update(_connection=None, _pid=None, _cache=OrderedDict(), _pending=[])
+        return state
@@ -0,0 +1,79 @@
+import os
+import queue
+import threading
+
+# Background writer for the rendered Location tables.
+#
+# `build_tables` hands each table to a `TableWriter` and moves straight on to rendering the next item
+# while a few threads write the earlier tables to disk. File writes release the GIL, so rendering and
+# I/O overlap. The queue between them is bounded: when the disk falls behind, `write` blocks until a
+# slot frees up, so no more than `max_pending` tables are ever held in memory.
+
+DEFAULT_THREADS = 4
+DEFAULT_MAX_PENDING = 256
+
+# Put on the queue once per thread to stop it
+_STOP = None
+
+
+class TableWriter:
+    """
+    Write `<item_id>.txt` files into `output_dir` from background threads.
+
+    Usage:
+        with TableWriter("output/distributions/complete") as writer:
+            writer.write("Axe", table)
+
+    A table that can't be written doesn't stop the others. Failures are kept in `errors` as
+    `(item_id, exception)` and reported per item when the writer is closed, which then raises.
+    """
+
+    def __init__(self, output_dir, threads=DEFAULT_THREADS, max_pending=DEFAULT_MAX_PENDING):
+        self.output_dir = output_dir
+        self.errors = []
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max(1, threads))]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is _STOP:
+                return
+            item_id, text = task
+            try:
+                with open(os.path.join(self.output_dir, f"{item_id}.txt"), "w") as output_file:
+                    output_file.write(text)
+            except Exception as e:
+                with self._lock:
+                    self.errors.append((item_id, e))
+            else:
+                with self._lock:
+                    self.written += 1
+
+    def write(self, item_id, text):
+        """Queue a table for writing; blocks while `max_pending` tables are already waiting."""
+        self._queue.put((item_id, text))
+
+    def close(self):
+        """Wait for every queued table to be written and return the list of failures."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        return self.errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        errors = self.close()
+        if errors and exc_type is None:
+            for item_id, error in errors:
+                print(f"Failed to write the table of {item_id}: {error}")
+            raise RuntimeError(f"{len(errors)} tables could not be written to {self.output_dir}")
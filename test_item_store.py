@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+import item_store
+
+CASES = [
+    {"a": -0.0025},
+    {"a": 1e10, "b": -2.5e-7},
+    {"a": 12345678901234567890, "b": True, "c": None, "d": "x"},
+    {"Axe": {"name": "Axe", "Containers": [{"Chance": 0.5, "Rolls": 4}]}, "Pot": {}},
+    {},
+]
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 9))
+@pytest.mark.parametrize("data", CASES)
+def test_json_object_round_trip_with_small_chunks(tmp_path, monkeypatch, data, chunk_size):
+    monkeypatch.setattr(item_store, "READ_CHUNK_SIZE", chunk_size)
+    for indent in (None, 4):
+        path = tmp_path / "all_items.json"
+        path.write_text(json.dumps(data, indent=indent))
+        assert list(item_store.iter_items(str(path))) == list(data.items())
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 9))
+def test_item_writer_round_trip_with_small_chunks(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(item_store, "READ_CHUNK_SIZE", chunk_size)
+    path = str(tmp_path / "all_items.json")
+    data = CASES[3]
+    with item_store.ItemWriter(path) as writer:
+        for item_id, record in data.items():
+            writer.write(item_id, record)
+    assert item_store.load_items(path) == data